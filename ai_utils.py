@@ -1,9 +1,17 @@
 import re
-from collections import Counter
+import heapq
+import threading
+from collections import Counter, defaultdict
+import numpy as np
+from scipy import sparse
+from sqlalchemy import func, insert, select
+from models import db, IndustrialVisit, VisitKeyword
+from cache_utils import TTLCache
+from version_utils import VISITS_SCOPE, get_versions
 
 
 def extract_keywords(text):
-   if not text:
+    if not text:
         return set()
     # Simple stop words list (can be expanded)
     stop_words = {'and', 'the', 'is', 'in', 'at', 'of', 'for', 'to', 'a', 'an', 'with', 'on', 'by'}
@@ -15,6 +23,10 @@ def extract_keywords(text):
     keywords = {w for w in words if w not in stop_words and len(w) > 2}
     return keywords
 
+def visit_text(visit):
+    # Combine title, description, company for matching
+    return f"{visit.title} {visit.description} {visit.visit_type} {visit.company_name}"
+
 def calculate_similarity(student_skills, visit_text):
     if not student_skills or not visit_text:
         return 0.0
@@ -39,9 +51,7 @@ def get_recommendations(student, all_visits):
     recommendations = []
     
     for visit in all_visits:
-        # Combine title, description, company for matching
-        visit_content = f"{visit.title} {visit.description} {visit.visit_type} {visit.company_name}"
-        score = calculate_similarity(student.skills, visit_content)
+        score = calculate_similarity(student.skills, visit_text(visit))
         
         # Only recommend if there is some relevance (e.g. > 0%) or give a boost for "fresh" visits
         # For demo purposes, we return everything sorted, but maybe highlight high scores
@@ -54,3 +64,353 @@ def get_recommendations(student, all_visits):
     recommendations.sort(key=lambda x: x['score'], reverse=True)
     
     return recommendations
+
+# --- KEYWORD INDEX ---
+
+def index_visit(visit):
+    """
+    Replaces the keyword postings of a visit. The visit must have an id
+    (flush first); the caller commits.
+    """
+    VisitKeyword.query.filter_by(visit_id=visit.id).delete(synchronize_session=False)
+    postings = [{'keyword': k, 'visit_id': visit.id} for k in extract_keywords(visit_text(visit))]
+    if postings:
+        db.session.execute(insert(VisitKeyword), postings)
+
+def index_visits(visits):
+    """
+    index_visit for many visits (anything with the visit columns as
+    attributes, e.g. RETURNING rows): one delete and one batched insert.
+    """
+    visit_ids = [visit.id for visit in visits]
+    if not visit_ids:
+        return
+    VisitKeyword.query.filter(VisitKeyword.visit_id.in_(visit_ids)).delete(synchronize_session=False)
+    postings = [{'keyword': k, 'visit_id': visit.id} for visit in visits for k in extract_keywords(visit_text(visit))]
+    if postings:
+        db.session.execute(insert(VisitKeyword.__table__), postings) # Core executemany, no ORM bookkeeping
+
+def index_visit_ids(connection, visit_ids, batch_size=1000):
+    """
+    index_visits on a raw connection, for the visits with visit_ids, reading
+    and indexing batch_size visits at a time (e.g. after a bulk load).
+    """
+    table = IndustrialVisit.__table__
+    for start in range(0, len(visit_ids), batch_size):
+        batch = visit_ids[start:start + batch_size]
+        connection.execute(VisitKeyword.__table__.delete().where(VisitKeyword.visit_id.in_(batch)))
+        visits = connection.execute(table.select().where(table.c.id.in_(batch))).fetchall()
+        postings = [{'keyword': k, 'visit_id': visit.id} for visit in visits for k in extract_keywords(visit_text(visit))]
+        if postings:
+            connection.execute(insert(VisitKeyword.__table__), postings)
+
+def rebuild_keyword_index(connection, batch_size=10000):
+    """
+    Re-indexes every visit on a raw connection. Used by migrations to backfill
+    databases created before the index existed.
+    """
+    connection.execute(VisitKeyword.__table__.delete())
+    visits = connection.execute(IndustrialVisit.__table__.select()).fetchall()
+    postings = []
+    for visit in visits:
+        postings.extend({'keyword': k, 'visit_id': visit.id} for k in extract_keywords(visit_text(visit)))
+        if len(postings) >= batch_size:
+            connection.execute(insert(VisitKeyword.__table__), postings)
+            postings = []
+    if postings:
+        connection.execute(insert(VisitKeyword.__table__), postings)
+
+def get_top_recommendations(student, k=3, exclude_ids=()):
+    """
+    Returns the top k approved visits for a student as [{'visit', 'score'}],
+    with the same overlap-ratio scores as get_recommendations. Only visits
+    sharing at least one keyword with the student's skills are scored.
+    """
+    student_keywords = extract_keywords(student.skills)
+    if not student_keywords:
+        return []
+
+    # Keywords each candidate visit shares with the student
+    common = (db.session.query(VisitKeyword.visit_id, func.count().label('common'))
+              .filter(VisitKeyword.keyword.in_(student_keywords))
+              .group_by(VisitKeyword.visit_id)
+              .subquery())
+    # Total keywords of each candidate visit (the score denominator)
+    totals = (db.session.query(VisitKeyword.visit_id, func.count().label('total'))
+              .join(common, common.c.visit_id == VisitKeyword.visit_id)
+              .group_by(VisitKeyword.visit_id)
+              .subquery())
+
+    query = (db.session.query(IndustrialVisit.id, common.c.common, totals.c.total)
+             .join(common, common.c.visit_id == IndustrialVisit.id)
+             .join(totals, totals.c.visit_id == IndustrialVisit.id)
+             .filter(IndustrialVisit.status == 'approved'))
+    if exclude_ids:
+        query = query.filter(IndustrialVisit.id.notin_(exclude_ids))
+
+    # Ties keep id order, matching the stable sort in get_recommendations
+    scored = ((visit_id, round(n_common / total * 100, 1))
+              for visit_id, n_common, total in query.order_by(IndustrialVisit.id))
+    top = heapq.nlargest(k, scored, key=lambda row: row[1])
+    if not top:
+        return []
+
+    visits = {v.id: v for v in IndustrialVisit.query.filter(IndustrialVisit.id.in_([vid for vid, _ in top]))}
+    return [{'visit': visits[vid], 'score': score} for vid, score in top]
+
+# --- MATRIX SCORING ---
+
+class TermMatrix:
+    """
+    Sparse approved-visit x term matrix for scoring many students at once.
+
+    Each visit row keeps its term columns, so a visit can be appended,
+    updated or dropped without re-tokenizing the others; the CSR matrix is
+    reassembled from the cached rows on the next query. The matrix lives in
+    the worker process and is loaded from the database on first use.
+
+    Other processes (web workers, the sweeper, imports) change visits too.
+    Every such change bumps the 'visits' data version, so each query first
+    compares it with the version the rows were synced at; when it moved,
+    rows of visits no longer approved are dropped and newly approved ones
+    tokenized, without reloading the rest.
+    """
+
+    def __init__(self):
+        self.vocab = {}
+        self.rows = {} # Every approved visit; empty for visits without keywords
+        self.version = None
+        self.loaded = False
+        self._snapshot = None # (matrix, row_ids, lengths, vocab), replaced whole, never mutated
+        self._lock = threading.Lock()
+
+    def load(self):
+        version = get_versions(VISITS_SCOPE)[VISITS_SCOPE] # Before reading, so later changes show as newer
+        with self._lock:
+            self.vocab, self.rows, self._snapshot = {}, {}, None
+            for visit in IndustrialVisit.query.filter_by(status='approved').yield_per(1000):
+                self._set_row(visit)
+            self.version = version
+            self.loaded = True
+
+    def refresh(self, batch_size=1000):
+        """Catches up with visit changes made since the last sync, if the 'visits' version moved."""
+        version = get_versions(VISITS_SCOPE)[VISITS_SCOPE]
+        if version == self.version:
+            return
+        approved = set(db.session.execute(select(IndustrialVisit.id)
+                                          .where(IndustrialVisit.status == 'approved')).scalars())
+        with self._lock:
+            for visit_id in set(self.rows) - approved:
+                del self.rows[visit_id]
+                self._snapshot = None
+            missing = sorted(approved - set(self.rows))
+            for start in range(0, len(missing), batch_size):
+                for visit in IndustrialVisit.query.filter(IndustrialVisit.id.in_(missing[start:start + batch_size]),
+                                                          IndustrialVisit.status == 'approved'):
+                    self._set_row(visit)
+            self.version = version
+
+    def upsert(self, visit):
+        """Adds, refreshes or drops a visit's row after its status or text changed."""
+        if not self.loaded:
+            return
+        with self._lock:
+            if visit.status == 'approved':
+                self._set_row(visit)
+            elif self.rows.pop(visit.id, None) is not None:
+                self._snapshot = None
+
+    def remove(self, visit_id):
+        with self._lock:
+            if self.rows.pop(visit_id, None) is not None:
+                self._snapshot = None
+
+    def _set_row(self, visit):
+        keywords = extract_keywords(visit_text(visit))
+        self.rows[visit.id] = np.array(sorted(self._column(k) for k in keywords), dtype=np.int32)
+        self._snapshot = None
+
+    def _column(self, keyword):
+        return self.vocab.setdefault(keyword, len(self.vocab))
+
+    def _build(self):
+        """Returns the current snapshot, assembling it from the rows if a write dropped it."""
+        with self._lock:
+            if self._snapshot is not None:
+                return self._snapshot
+            ids = sorted(self.rows)
+            lengths = np.array([len(self.rows[i]) for i in ids], dtype=np.int64)
+            indptr = np.concatenate(([0], np.cumsum(lengths)))
+            indices = np.concatenate([self.rows[i] for i in ids]) if ids else np.array([], dtype=np.int32)
+            matrix = sparse.csr_matrix((np.ones(len(indices), dtype=np.int32), indices, indptr),
+                                       shape=(len(ids), len(self.vocab)))
+            # Later words get columns past the matrix' width, which the vocab lookups skip
+            self._snapshot = (matrix, np.array(ids, dtype=np.int64), lengths, self.vocab)
+            return self._snapshot
+
+    def top_k(self, students, k=3, exclude_ids=None):
+        """
+        Returns [(visit_id, score), ...] for each student, best first, with the
+        same percentages and tie order as get_recommendations.
+        exclude_ids maps student id -> visit ids to skip.
+        """
+        if not self.loaded:
+            self.load()
+        else:
+            self.refresh()
+        # Scores one snapshot, so concurrent writes can't swap arrays out from under it
+        matrix, row_ids, lengths, vocab = self._build()
+        exclude_ids = exclude_ids or {}
+
+        # Binary students x terms matrix; terms unknown to any visit can't match
+        n_terms = matrix.shape[1]
+        indptr, indices = [0], []
+        for student in students:
+            cols = {vocab[k] for k in extract_keywords(student.skills) if vocab.get(k, n_terms) < n_terms}
+            indices.extend(sorted(cols))
+            indptr.append(len(indices))
+        skills = sparse.csr_matrix((np.ones(len(indices), dtype=np.int32), indices, indptr),
+                                   shape=(len(students), n_terms))
+
+        # students x visits counts of shared keywords, in one product
+        common = (skills @ matrix.T).tocsr()
+        common.sort_indices()
+
+        results = []
+        for row, student in enumerate(students):
+            start, end = common.indptr[row], common.indptr[row + 1]
+            cols = common.indices[start:end]
+            ratios = (common.data[start:end] / lengths[cols]).tolist()
+            skip = set(exclude_ids.get(student.id, ()))
+            scored = ((visit_id, round(ratio * 100, 1))
+                      for visit_id, ratio in zip(row_ids[cols].tolist(), ratios)
+                      if visit_id not in skip)
+            results.append(heapq.nlargest(k, scored, key=lambda item: item[1]))
+        return results
+
+term_matrix = TermMatrix()
+
+def get_matrix_recommendations(student, k=3, exclude_ids=()):
+    """
+    Same contract as get_top_recommendations, scored against the in-memory term matrix.
+    """
+    skip = set(exclude_ids)
+    while True:
+        top = term_matrix.top_k([student], k=k, exclude_ids={student.id: skip})[0]
+        if not top:
+            return []
+        visits = {v.id: v for v in IndustrialVisit.query.filter(IndustrialVisit.id.in_([vid for vid, _ in top]),
+                                                                IndustrialVisit.status == 'approved')}
+        stale = {vid for vid, _ in top if vid not in visits}
+        if not stale:
+            return [{'visit': visits[vid], 'score': score} for vid, score in top]
+        # Rows can outlive a status change made by another process (e.g. visits the
+        # sweeper completed); skip them and rank again, so k approved visits still come back
+        skip |= stale
+
+# --- PER-STUDENT CACHE ---
+
+class RecommendationCache:
+    """
+    Each student's ranked (visit_id, score) list, kept until the student's
+    skills change or a visit sharing one of their keywords is approved,
+    rejected, completed or deleted: visits without a common keyword score 0
+    and can't enter or leave the list. A keyword -> students map finds the
+    entries to drop.
+
+    Lists are stored before the student's exclusions (applied visits) are
+    taken out, deep enough to still hold k picks afterwards, so applying
+    needs no invalidation. The cache is per process, so events handled
+    elsewhere (e.g. visits completed by the sweeper) don't reach it: hits
+    are re-checked against the database, SPARE extra picks stand in for
+    visits that dropped out, and a list left short of k is ranked again.
+    Entries also expire after ttl seconds.
+    """
+    SPARE = 5
+
+    def __init__(self, maxsize=10000, ttl=300):
+        self.maxsize = maxsize
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._students_by_keyword = defaultdict(set)
+        self._keywords_by_student = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def recommend(self, student, k=3, exclude_ids=(), score=None):
+        """
+        Same contract as get_top_recommendations; score (get_top_recommendations
+        by default, or get_matrix_recommendations) ranks on a miss.
+        """
+        score = score or get_top_recommendations
+        exclude = set(exclude_ids)
+        entry = self._entries.get(student.id)
+        if entry is not None and entry[0] >= k + len(exclude):
+            depth, ranked = entry
+            candidates = [(visit_id, s) for visit_id, s in ranked if visit_id not in exclude]
+            # By primary key; a visit completed by another process drops out here
+            visits = {v.id: v for v in IndustrialVisit.query.filter(
+                IndustrialVisit.id.in_([vid for vid, _ in candidates]),
+                IndustrialVisit.status == 'approved')} if candidates else {}
+            top = [{'visit': visits[vid], 'score': s} for vid, s in candidates if vid in visits][:k]
+            if len(top) == k or len(ranked) < depth:
+                return top # Full, or the list already held every match
+            # Too many dropped out for the spares to cover; rank again
+
+        depth = k + len(exclude) + self.SPARE
+        generation = self._generation
+        picks = score(student, k=depth)
+        self._store(student.id, extract_keywords(student.skills), depth,
+                    [(r['visit'].id, r['score']) for r in picks], generation)
+        return [r for r in picks if r['visit'].id not in exclude][:k]
+
+    def _store(self, student_id, keywords, depth, ranked, generation):
+        with self._lock:
+            if generation != self._generation:
+                return # Invalidated while ranking; the list may predate the event
+            self._forget(student_id)
+            self._keywords_by_student[student_id] = keywords
+            for keyword in keywords:
+                self._students_by_keyword[keyword].add(student_id)
+            self._entries.set(student_id, (depth, ranked))
+            if len(self._keywords_by_student) > 2 * self.maxsize:
+                # Students the LRU has evicted since
+                for stale_id in [sid for sid in self._keywords_by_student if self._entries.get(sid) is None]:
+                    self._forget(stale_id)
+
+    def _forget(self, student_id):
+        for keyword in self._keywords_by_student.pop(student_id, ()):
+            students = self._students_by_keyword[keyword]
+            students.discard(student_id)
+            if not students:
+                del self._students_by_keyword[keyword]
+
+    def invalidate_student(self, student_id):
+        """After the student's skills changed."""
+        with self._lock:
+            self._generation += 1
+            self._forget(student_id)
+            self._entries.delete(student_id)
+
+    def invalidate_visit(self, visit):
+        """After a visit was approved, rejected or completed. Returns the students dropped."""
+        return self.invalidate_keywords(extract_keywords(visit_text(visit)))
+
+    def invalidate_keywords(self, keywords):
+        """Drops every student sharing one of keywords (e.g. those of deleted visits)."""
+        with self._lock:
+            self._generation += 1
+            students = set()
+            for keyword in keywords:
+                students.update(self._students_by_keyword.get(keyword, ()))
+            for student_id in students:
+                self._forget(student_id)
+                self._entries.delete(student_id)
+        return students
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._students_by_keyword.clear()
+            self._keywords_by_student.clear()
@@ -1,31 +1,54 @@
 # Flask imports
-from flask import Flask, render_template, request, redirect, url_for, session, flash, send_file
-from models import db, User, IndustrialVisit, Application, MoU, Notification, Review
+from flask import Flask, Response, jsonify, render_template, request, redirect, url_for, session, flash, send_file
+from models import db, User, IndustrialVisit, Application, MoU, Notification, NotificationCounter, ProviderStats, Review, EmailOutbox
+from cache_utils import TTLCache
+from search_utils import search_visits
+from paging_utils import paginate_request
+from migrations import upgrade
+from db_routing import replica_reads, use_replica
 from datetime import datetime
 import os
-from werkzeug.security import generate_password_hash, check_password_hash
-from io import BytesIO
-from fpdf import FPDF
+import json
+import hashlib
+import queue
+import time
+from collections import Counter, namedtuple
+from sqlalchemy import Integer, bindparam, func, insert, literal, select, update
+from sqlalchemy.orm import joinedload
+from sqlalchemy.exc import IntegrityError
+from auth_utils import FailedLoginCache, hash_password, verify_password
+from pdf_utils import PDFCache, mou_fields
+from export_utils import render_pool, stream_zip
+from metrics import init_metrics, render_prometheus
+from fragment_cache import FragmentCacheExtension, make_fragment_cache
+from version_utils import UPSERTS, VISITS_SCOPE, bump_versions, user_scope, version_stamp
+from pubsub import make_broker
+from import_utils import ImportReport, detect_format, valid_batches
 from dotenv import load_dotenv
 from whitenoise import WhiteNoise
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 
+# Tools that must never touch the configured database (benchmark.py) name theirs here;
+# read before .env, which overrides DATABASE_URL
+forced_database_url = os.environ.get('FORCE_DATABASE_URL')
+
 # Load environment variables
 # Load environment variables (Force Override)
 from dotenv import load_dotenv, find_dotenv
 env_file = find_dotenv(raise_error_if_not_found=True)
 load_dotenv(env_file, override=True)
 
-from flask_mail import Mail, Message
+from flask_mail import Mail
 
 # Initialize Flask app
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'default_dev_secret_key')
 
 # --- MAIL CONFIGURATION (Real SMTP) ---
-app.config['MAIL_SERVER'] = 'smtp.gmail.com' # Default to Gmail
-app.config['MAIL_PORT'] = 587
-app.config['MAIL_USE_TLS'] = True
+app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.gmail.com') # Default to Gmail
+app.config['MAIL_PORT'] = int(os.environ.get('MAIL_PORT', 587))
+app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS', 'True') == 'True'
 app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME')
 app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD')
 # Explicitly set sender, fallback to username if not set
@@ -33,21 +56,101 @@ app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_DEFAULT_SENDER') or os.
 
 mail = Mail(app)
 
+# Outbox delivery (mail_worker.py): retry with exponential backoff, then give up
+app.config['MAIL_MAX_ATTEMPTS'] = int(os.environ.get('MAIL_MAX_ATTEMPTS', 6))
+app.config['MAIL_RETRY_BASE_SECONDS'] = int(os.environ.get('MAIL_RETRY_BASE_SECONDS', 30))
+app.config['MAIL_RETRY_MAX_SECONDS'] = int(os.environ.get('MAIL_RETRY_MAX_SECONDS', 3600))
+
 # Database Configuration
 basedir = os.path.abspath(os.path.dirname(__file__))
 upload_folder = os.path.join(basedir, 'static', 'uploads')
 
 # Use DATABASE_URL if present
-database_url = os.environ.get('DATABASE_URL')
+database_url = forced_database_url or os.environ.get('DATABASE_URL')
 if database_url and database_url.startswith("postgres://"):
    database_url = database_url.replace("postgres://", "postgresql://", 1)
 
 app.config['SQLALCHEMY_DATABASE_URI'] = database_url or 'sqlite:///' + os.path.join(basedir, 'iv_planner.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+# Connection pool (mostly for Postgres); unset sizes keep SQLAlchemy's defaults
+engine_options = {'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', 'True') == 'True'}
+for option, variable in [('pool_size', 'DB_POOL_SIZE'), ('max_overflow', 'DB_MAX_OVERFLOW'),
+                         ('pool_recycle', 'DB_POOL_RECYCLE'), ('pool_timeout', 'DB_POOL_TIMEOUT')]:
+    if os.environ.get(variable):
+        engine_options[option] = int(os.environ[variable])
+# Threads per web worker (the Procfile starts gunicorn with WEB_THREADS). Up to
+# SSE_MAX_STREAMS of them hold notification streams, which need no connection; the
+# pool grows to one connection per remaining thread, so requests never queue for
+# one. On Postgres, max_connections must cover workers x that (or set DB_MAX_OVERFLOW).
+app.config['WEB_THREADS'] = int(os.environ.get('WEB_THREADS', 128))
+app.config['SSE_MAX_STREAMS'] = int(os.environ.get('SSE_MAX_STREAMS', app.config['WEB_THREADS'] // 4))
+if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite') and 'max_overflow' not in engine_options:
+    request_threads = app.config['WEB_THREADS'] - app.config['SSE_MAX_STREAMS']
+    engine_options['max_overflow'] = max(0, request_threads - engine_options.get('pool_size', 5))
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
+
+# Optional read replica for read-only views (see db_routing.py)
+replica_url = os.environ.get('REPLICA_DATABASE_URL')
+if replica_url:
+    if replica_url.startswith("postgres://"):
+        replica_url = replica_url.replace("postgres://", "postgresql://", 1)
+    app.config['SQLALCHEMY_BINDS'] = {'replica': replica_url}
+# After a write, the same browser reads from the primary for this long (covers replication lag)
+app.config['REPLICA_PIN_SECONDS'] = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
 app.config['UPLOAD_FOLDER'] = upload_folder
+# Keep provider dashboard stats in a table updated on writes instead of aggregating per request
+app.config['PROVIDER_STATS_MATERIALIZED'] = os.environ.get('PROVIDER_STATS_MATERIALIZED', 'False') == 'True'
+# Rendered MoU PDFs, cached on disk by content hash
+app.config['MOU_PDF_CACHE_DIR'] = os.environ.get('MOU_PDF_CACHE_DIR', os.path.join(basedir, 'cache', 'mou_pdfs'))
+app.config['MOU_PDF_CACHE_MAX_BYTES'] = int(os.environ.get('MOU_PDF_CACHE_MAX_BYTES', 100 * 1024 * 1024))
+mou_pdf_cache = PDFCache(app.config['MOU_PDF_CACHE_DIR'], max_bytes=app.config['MOU_PDF_CACHE_MAX_BYTES'])
+# Processes rendering PDFs for bulk exports, shared by all exports of a web worker
+app.config['PDF_RENDER_WORKERS'] = int(os.environ.get('PDF_RENDER_WORKERS', 2))
+# New password hashes use this Werkzeug method; older hashes are upgraded on the user's next login
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+# Failed logins allowed per account and per client address before further attempts are refused
+app.config['LOGIN_MAX_FAILURES'] = int(os.environ.get('LOGIN_MAX_FAILURES', 5))
+app.config['LOGIN_MAX_FAILURES_PER_IP'] = int(os.environ.get('LOGIN_MAX_FAILURES_PER_IP', 50))
+app.config['LOGIN_FAILURE_WINDOW'] = int(os.environ.get('LOGIN_FAILURE_WINDOW', 300))
+failed_logins_by_email = FailedLoginCache(app.config['LOGIN_MAX_FAILURES'], app.config['LOGIN_FAILURE_WINDOW'])
+failed_logins_by_ip = FailedLoginCache(app.config['LOGIN_MAX_FAILURES_PER_IP'], app.config['LOGIN_FAILURE_WINDOW'])
+# Rendered dashboard panels ({% cache %} in the templates): 'memory', 'file' (shared by
+# the workers on one host) or 'none'. Writes change the keys, the TTL bounds staleness
+# from anything they miss.
+app.config['FRAGMENT_CACHE'] = os.environ.get('FRAGMENT_CACHE', 'memory')
+app.config['FRAGMENT_CACHE_DIR'] = os.environ.get('FRAGMENT_CACHE_DIR', os.path.join(basedir, 'cache', 'fragments'))
+app.config['FRAGMENT_CACHE_TTL'] = int(os.environ.get('FRAGMENT_CACHE_TTL', 300))
+app.jinja_env.add_extension(FragmentCacheExtension)
+app.jinja_env.fragment_cache = make_fragment_cache(app.config['FRAGMENT_CACHE'], app.config['FRAGMENT_CACHE_DIR'],
+                                                   app.config['FRAGMENT_CACHE_TTL'])
+# Recommendation scoring: 'index' (keyword postings in the DB) or 'matrix' (in-memory sparse term matrix)
+app.config['RECOMMENDATION_MODE'] = os.environ.get('RECOMMENDATION_MODE', 'index')
 
-# Production Static Files
-app.wsgi_app = WhiteNoise(app.wsgi_app, root='static/')
+# Production Static Files: build_static.py writes content-hashed copies (and .gz/.br
+# variants) to staticfiles/; url_for('static') then points at them and they're cached forever
+static_manifest = {}
+static_manifest_path = os.path.join(basedir, 'staticfiles', 'manifest.json')
+if os.path.exists(static_manifest_path):
+    with open(static_manifest_path) as f:
+        static_manifest = json.load(f)
+    hashed_static_urls = {'/static/' + name for name in static_manifest.values()}
+    app.wsgi_app = WhiteNoise(app.wsgi_app, root=os.path.join(basedir, 'staticfiles'), prefix='static/',
+                              immutable_file_test=lambda path, url: url in hashed_static_urls)
+else:
+    app.wsgi_app = WhiteNoise(app.wsgi_app, root=os.path.join(basedir, 'static'), prefix='static/')
+
+# Reverse proxies in front of the app (the Heroku router is one); their X-Forwarded-For
+# gives request.remote_addr the client's address instead of the router's, which the
+# per-address login throttle relies on. Set to 0 when clients connect directly.
+app.config['PROXY_HOPS'] = int(os.environ.get('PROXY_HOPS', 1))
+if app.config['PROXY_HOPS']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_HOPS'])
+
+@app.url_defaults
+def hashed_static_filename(endpoint, values):
+    if endpoint == 'static' and 'filename' in values:
+        values['filename'] = static_manifest.get(values['filename'], values['filename'])
 
 # Ensure upload directory exists
 if not os.path.exists(upload_folder):
@@ -55,44 +158,158 @@ if not os.path.exists(upload_folder):
 
 db.init_app(app)
 
-# Helper: Send Email (Real)
+# Per-request SQL/render/SMTP timings in a Server-Timing header and histograms at /admin/metrics
+app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', 'False') == 'True'
+init_metrics(app)
+
+# Helper: Send Email (queued in the outbox, delivered by mail_worker.py)
 def send_email(to_email, subject, body):
+    return queue_emails([(to_email, subject, body)])
+
+def queue_emails(emails):
+    """
+    Queues (to_email, subject, body) tuples for delivery and commits.
+    Returns (success, error) like the old synchronous send.
+    """
     try:
-        sender = app.config['MAIL_USERNAME']
-        msg = Message(subject=subject, recipients=[to_email], body=body, sender=sender)
-        mail.send(msg)
-        print(f"[SUCCESS] Email sent to {to_email}")
+        add_emails(emails)
+        db.session.commit()
         return True, None
     except Exception as e:
-        print(f"[FAILED] Email sending failed: {str(e)}")
+        db.session.rollback()
+        print(f"[FAILED] Email queueing failed: {str(e)}")
         return False, str(e)
 
+def add_emails(emails):
+    # Batched outbox insert into the current transaction; the caller commits
+    rows = [{'to_email': to_email, 'subject': subject, 'body': body} for to_email, subject, body in emails]
+    if rows:
+        db.session.execute(insert(EmailOutbox), rows)
+
 # Helper: Create Notification & Email
 def notify_user(user_id, message, email_subject=None):
-    # 1. In-App Notification
-    notif = Notification(user_id=user_id, message=message)
-    db.session.add(notif)
+    notify_users([(user_id, message)], email_subject)
+
+def notify_users(notifications, email_subject=None):
+    """
+    Notifies many users at once from (user_id, message) pairs: one batched
+    Notification insert, one query for the recipients' emails and one
+    batched outbox insert, committed together.
+    """
+    if not notifications:
+        return
+
+    # 1. In-App Notifications
+    new_counts = Counter(user_id for user_id, _ in notifications)
+    # Counters are created (from the notifications so far) before adding to them, in this
+    # transaction: a first header read running concurrently then waits for this one
+    # instead of counting without the new rows, which would leave its counter short
+    create_unread_counters(db.session, list(new_counts))
+    db.session.execute(insert(Notification), [{'user_id': user_id, 'message': message}
+                                              for user_id, message in notifications])
+    counters = NotificationCounter.__table__
+    db.session.execute(update(counters)
+                       .where(counters.c.user_id == bindparam('uid'))
+                       .values(unread=counters.c.unread + bindparam('n')),
+                       [{'uid': user_id, 'n': n} for user_id, n in new_counts.items()])
+
+    # 2. Email Notifications
+    user_ids = {user_id for user_id, _ in notifications}
+    emails = dict(db.session.query(User.id, User.email).filter(User.id.in_(user_ids)))
+    subject = email_subject or "New Notification from Provics"
+    add_emails((emails[user_id], subject, message) for user_id, message in notifications if user_id in emails)
+
+    bump_versions(*[user_scope('notifications', user_id) for user_id in new_counts])
     db.session.commit()
-    
-    # 2. Email Notification
-    user = User.query.get(user_id)
-    if user:
-        subject = email_subject or "New Notification from Provics"
-        send_email(user.email, subject, message)
+
+    for user_id in new_counts:
+        notification_header_cache.delete(user_id)
+    # Push to open notification streams, now that the rows are visible
+    for user_id, message in notifications:
+        event_broker.publish(notification_channel(user_id), json.dumps({'message': message}))
+
+# Live notifications over Server-Sent Events (see pubsub.py): 'memory' for a single
+# worker, 'relay' to share events between workers and the sweeper through pubsub.py
+app.config['EVENT_BROKER'] = os.environ.get('EVENT_BROKER', 'memory')
+app.config['EVENT_RELAY_ADDRESS'] = os.environ.get('EVENT_RELAY_ADDRESS', '127.0.0.1:7070')
+# Each open stream holds one of the worker's threads, so SSE_MAX_STREAMS (set with the
+# pool above) stays well below WEB_THREADS; beyond it clients are told to come back later
+app.config['SSE_RETRY_SECONDS'] = int(os.environ.get('SSE_RETRY_SECONDS', 60))
+# A stream whose page was left is only noticed when the next heartbeat fails to send
+app.config['SSE_HEARTBEAT_SECONDS'] = int(os.environ.get('SSE_HEARTBEAT_SECONDS', 5))
+# Streams end after this long and the browser reconnects, so threads get recycled
+app.config['SSE_MAX_SECONDS'] = int(os.environ.get('SSE_MAX_SECONDS', 300))
+event_broker = make_broker(app.config['EVENT_BROKER'], app.config['EVENT_RELAY_ADDRESS'])
+
+def notification_channel(user_id):
+    return f'notifications:{user_id}'
+
+# Header notifications per user: (unread_count, recent 5). Each worker keeps its
+# own copy, so another worker's writes show up within the TTL at the latest.
+app.config['NOTIFICATION_CACHE_TTL'] = int(os.environ.get('NOTIFICATION_CACHE_TTL', 30))
+notification_header_cache = TTLCache(maxsize=10000, ttl=app.config['NOTIFICATION_CACHE_TTL'])
+
+# Detached copy of a Notification that is safe to keep across requests
+NotificationSnapshot = namedtuple('NotificationSnapshot', ['message', 'is_read', 'created_at'])
+
+def create_unread_counters(connection, user_ids):
+    """
+    Creates the users' missing unread counters from a COUNT, in one statement on
+    connection (a Connection or the session). Counters that exist are left alone.
+    """
+    table = NotificationCounter.__table__
+    unread = (select(func.count(Notification.id))
+              .where(Notification.user_id == User.id, Notification.is_read == False)
+              .scalar_subquery())
+    counts = select(User.id, unread).where(User.id.in_(user_ids))
+    upsert = UPSERTS.get(db.engine.dialect.name)
+    if upsert is not None:
+        connection.execute(upsert(table).from_select(['user_id', 'unread'], counts)
+                           .on_conflict_do_nothing(index_elements=[table.c.user_id]))
+        return
+    try:
+        with connection.begin_nested():
+            connection.execute(insert(table).from_select(
+                ['user_id', 'unread'], counts.where(~User.id.in_(select(table.c.user_id)))))
+    except IntegrityError:
+        pass # Created concurrently
+
+def load_notification_header(user_id):
+    counter = NotificationCounter.query.get(user_id)
+    if counter is None:
+        # Counted and stored on the primary, in one statement: a count from a lagging
+        # replica would stay wrong, and committing the request session mid-render
+        # would expire its objects
+        table = NotificationCounter.__table__
+        with db.engine.begin() as connection:
+            create_unread_counters(connection, [user_id])
+            unread = connection.execute(select(table.c.unread).where(table.c.user_id == user_id)).scalar_one()
+    else:
+        unread = counter.unread
+    recent = (Notification.query.filter_by(user_id=user_id)
+              .order_by(Notification.created_at.desc()).limit(5).all())
+    return unread, [NotificationSnapshot(n.message, n.is_read, n.created_at) for n in recent]
 
 # Context Processor for Notifications in Header
 @app.context_processor
 def inject_notifications():
     if 'user_id' in session:
-        unread_count = Notification.query.filter_by(user_id=session['user_id'], is_read=False).count()
-        recent_notifs = Notification.query.filter_by(user_id=session['user_id']).order_by(Notification.created_at.desc()).limit(5).all()
+        header = notification_header_cache.get(session['user_id'])
+        if header is None:
+            with use_replica():
+                header = load_notification_header(session['user_id'])
+            notification_header_cache.set(session['user_id'], header)
+        unread_count, recent_notifs = header
         return dict(unread_count=unread_count, notifications=recent_notifs)
     return dict(unread_count=0, notifications=[])
 
 
-# Create Database tables (run once)
+# Apply pending schema migrations (see migrations.py). Deployments that run
+# migrations.py as a release step can turn this off with AUTO_MIGRATE=False.
+app.config['AUTO_MIGRATE'] = os.environ.get('AUTO_MIGRATE', 'True') == 'True'
 with app.app_context():
-    db.create_all()
+    if app.config['AUTO_MIGRATE']:
+        upgrade(db.engine)
     # No default users created. Real registration required.
 
 @app.route('/')
@@ -102,12 +319,20 @@ def index():
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
-        email = request.form['email']
+        email = request.form['email'].strip().lower()
         password = request.form['password']
         
-        user = User.query.filter_by(email=email).first()
+        # Refuse bursts before spending any time on hashing
+        if failed_logins_by_email.blocked(email) or failed_logins_by_ip.blocked(request.remote_addr):
+            flash('Too many failed login attempts. Please try again in a few minutes.', 'error')
+            return render_template('login.html'), 429
+        
+        user = User.query.filter(func.lower(User.email) == email).first()
         
-        if user and check_password_hash(user.password_hash, password):
+        if user and verify_password(user, password, app.config['PASSWORD_HASH_METHOD']):
+            if user in db.session.dirty:
+                db.session.commit() # Rehashed with the current method
+            failed_logins_by_email.reset(email)
             session['user_id'] = user.id
             session['role'] = user.role
             session['name'] = user.name
@@ -121,6 +346,8 @@ def login():
             elif user.role == 'admin':
                 return redirect(url_for('admin_dashboard'))
         else:
+            failed_logins_by_email.record_failure(email)
+            failed_logins_by_ip.record_failure(request.remote_addr)
             flash('Invalid email or password', 'error')
             
     return render_template('login.html')
@@ -144,10 +371,10 @@ def register():
             flash('Password must be at least 6 characters.', 'error')
             return render_template('register.html')
         
-        if User.query.filter_by(email=email).first():
+        if User.query.filter(func.lower(User.email) == email.strip().lower()).first():
             flash('Email already registered', 'error')
         else:
-            hashed_pw = generate_password_hash(password)
+            hashed_pw = hash_password(password, app.config['PASSWORD_HASH_METHOD'])
             new_user = User(email=email, password_hash=hashed_pw, name=name, role=role)
             db.session.add(new_user)
             db.session.commit()
@@ -167,58 +394,63 @@ def logout():
 
 # --- DASHBOARDS ---
 
-from ai_utils import get_recommendations
-
-def check_expired_mous():
-    with app.app_context(): # Ensure existing context usage if called outside
-        pass # Not needed if inside route
-    today = datetime.now().date()
-    # Need to import/ensure models are available, they are top level
-    expired_mous = MoU.query.filter(MoU.status == 'active', MoU.end_date < today).all()
-    for mou in expired_mous:
-        mou.status = 'expired'
-        # notify_user handles db session for notif, but here we modify Mou, so we need commit
-        notify_user(mou.college_id, f"Your MoU has expired.", "MoU Expired")
-        notify_user(mou.provider_id, f"MoU has expired.", "MoU Expired")
-    if expired_mous:
-        db.session.commit()
+from ai_utils import (RecommendationCache, extract_keywords, get_top_recommendations, get_matrix_recommendations,
+                      index_visit, index_visits, term_matrix, visit_text)
+
+# Ranked recommendations per student, dropped when their skills or a matching visit change
+app.config['RECOMMENDATION_CACHE_SIZE'] = int(os.environ.get('RECOMMENDATION_CACHE_SIZE', 10000))
+app.config['RECOMMENDATION_CACHE_TTL'] = int(os.environ.get('RECOMMENDATION_CACHE_TTL', 300))
+recommendation_cache = RecommendationCache(maxsize=app.config['RECOMMENDATION_CACHE_SIZE'],
+                                           ttl=app.config['RECOMMENDATION_CACHE_TTL'])
+
+# MoU expiry and visit completion run in sweeper.py, outside the request path
 
 @app.route('/student/dashboard')
+@replica_reads
 def student_dashboard():
     if 'user_id' not in session or session['role'] != 'student':
         return redirect(url_for('login'))
     
     search_query = request.args.get('search')
     type_filter = request.args.get('type')
+    page = request.args.get('page', 1, type=int)
     
-    # Base query
-    query = IndustrialVisit.query.filter_by(status='approved')
-    
-    # Filters
+    search_results = None
+    visit_page = None
     if search_query:
-        query = query.filter(IndustrialVisit.title.contains(search_query) | IndustrialVisit.description.contains(search_query))
-    if type_filter:
-        query = query.filter_by(visit_type=type_filter)
-        
-    available_visits = query.limit(50).all()
+        # Full-text search, ranked by relevance
+        search_results = search_visits(search_query, page=page, per_page=20, visit_type=type_filter)
+        available_visits = search_results.items
+    else:
+        # Base query
+        query = IndustrialVisit.query.filter_by(status='approved')
+        if type_filter:
+            query = query.filter_by(visit_type=type_filter)
+        # Keyset pages over the id, so later pages stay as cheap as the first
+        visit_page = paginate_request(query, IndustrialVisit.id)
+        available_visits = visit_page.items
     
-    my_applications = Application.query.filter_by(student_id=session['user_id']).all()
+    # The template shows each application's visit; load them in the same query
+    my_applications = (Application.query.options(joinedload(Application.visit))
+                       .filter_by(student_id=session['user_id']).all())
     user_details = User.query.get(session['user_id'])
     
     # AI Recommendations
-    # We pass ALL approved visits to the AI engine to rank them for the user
-    all_approved = IndustrialVisit.query.filter_by(status='approved').all()
-    recommendations = get_recommendations(user_details, all_approved)
-    
-    # Filter recommendations to only show top 3 that are NOT applied to and have score > 0
-    applied_ids = [app.visit_id for app in my_applications]
-    top_picks = [r for r in recommendations if r['visit'].id not in applied_ids and r['score'] > 0][:3]
+    # Top 3 approved visits that are NOT applied to, scored through the keyword index.
+    # Called by the template only when its cached panel is out of date.
+    def load_recommendations():
+        applied_ids = [app.visit_id for app in my_applications]
+        score = get_matrix_recommendations if app.config['RECOMMENDATION_MODE'] == 'matrix' else get_top_recommendations
+        return recommendation_cache.recommend(user_details, k=3, exclude_ids=applied_ids, score=score)
     
     return render_template('dashboard_student.html', 
                            user=user_details, 
                            visits=available_visits, 
+                           search_results=search_results,
+                           visit_page=visit_page,
                            applications=my_applications,
-                           recommendations=top_picks)
+                           load_recommendations=load_recommendations,
+                           versions=version_stamp(VISITS_SCOPE, user_scope('student', user_details.id)))
 
 @app.route('/student/profile/edit', methods=['GET', 'POST'])
 def edit_profile():
@@ -234,7 +466,9 @@ def edit_profile():
         # Resume Link (or upgrade to file upload later)
         user.resume_link = request.form['resume_link']
         
+        bump_versions(user_scope('student', user.id))
         db.session.commit()
+        recommendation_cache.invalidate_student(user.id)
         flash('Profile updated successfully!', 'success')
         return redirect(url_for('student_dashboard'))
         
@@ -244,83 +478,134 @@ def edit_profile():
 def mark_notifications_read():
     if 'user_id' in session:
         Notification.query.filter_by(user_id=session['user_id'], is_read=False).update({'is_read': True})
+        NotificationCounter.query.filter_by(user_id=session['user_id']).update({'unread': 0})
+        bump_versions(user_scope('notifications', session['user_id']))
         db.session.commit()
+        notification_header_cache.delete(session['user_id'])
     return redirect(request.referrer)
 
 
 @app.route('/college/dashboard')
+@replica_reads
 def college_dashboard():
     if 'user_id' not in session or session['role'] != 'college':
         return redirect(url_for('login'))
         
-    check_expired_mous()
+    pending_page = paginate_request(IndustrialVisit.query.filter_by(status='pending'), IndustrialVisit.id)
+    college_id = session['user_id']
     
-    pending_visits = IndustrialVisit.query.filter_by(status='pending').all()
-    approved_visits_count = IndustrialVisit.query.filter_by(status='approved').count()
-    rejected_visits_count = IndustrialVisit.query.filter_by(status='rejected').count()
+    # Stats and MoU Data, loaded by the template only when its cached panels are out of date
+    def load_stats():
+        return {
+            'approved_visits': IndustrialVisit.query.filter_by(status='approved').count(),
+            'rejected_visits': IndustrialVisit.query.filter_by(status='rejected').count(),
+            'active_mous': MoU.query.filter_by(college_id=college_id, status='active').count(),
+            'pending_mous': MoU.query.filter_by(college_id=college_id, status='pending').count()
+        }
     
-    # MoU Data
-    my_mous = MoU.query.filter_by(college_id=session['user_id']).all()
-    active_mou_count = MoU.query.filter_by(college_id=session['user_id'], status='active').count()
-    pending_mou_count = MoU.query.filter_by(college_id=session['user_id'], status='pending').count()
-    
-    stats = {
-        'approved_visits': approved_visits_count,
-        'rejected_visits': rejected_visits_count,
-        'active_mous': active_mou_count,
-        'pending_mous': pending_mou_count
-    }
+    def load_mous():
+        return MoU.query.filter_by(college_id=college_id).all()
     
     return render_template('dashboard_college.html', 
                            user=session, 
-                           pending_visits=pending_visits, 
-                           mous=my_mous,
-                           stats=stats)
+                           pending_visits=pending_page.items,
+                           pending_page=pending_page,
+                           load_mous=load_mous,
+                           load_stats=load_stats,
+                           versions=version_stamp(VISITS_SCOPE, user_scope('college', college_id)))
+
+def provider_stats_select(provider_id):
+    # One row of grouped aggregates, instead of loading every application and review
+    total_visits = (select(func.count(IndustrialVisit.id))
+                    .where(IndustrialVisit.provider_id == provider_id).scalar_subquery())
+    total_applications = (select(func.count(Application.id))
+                          .join(IndustrialVisit, Application.visit_id == IndustrialVisit.id)
+                          .where(IndustrialVisit.provider_id == provider_id).scalar_subquery())
+    review_count = (select(func.count(Review.id))
+                    .join(IndustrialVisit, Review.visit_id == IndustrialVisit.id)
+                    .where(IndustrialVisit.provider_id == provider_id).scalar_subquery())
+    rating_sum = (select(func.coalesce(func.sum(Review.rating), 0))
+                  .join(IndustrialVisit, Review.visit_id == IndustrialVisit.id)
+                  .where(IndustrialVisit.provider_id == provider_id).scalar_subquery())
+    return select(literal(provider_id, Integer).label('provider_id'), total_visits.label('total_visits'),
+                  total_applications.label('total_applications'), review_count.label('review_count'),
+                  rating_sum.label('rating_sum'))
+
+def compute_provider_stats(provider_id):
+    return ProviderStats(**db.session.execute(provider_stats_select(provider_id)).one()._asdict())
+
+def get_provider_stats(provider_id):
+    if not app.config['PROVIDER_STATS_MATERIALIZED']:
+        return compute_provider_stats(provider_id)
+    stats = ProviderStats.query.get(provider_id)
+    if stats is None:
+        # Computed and inserted by one statement on the primary, so no bump can land between
+        # the count and the row existing and replica lag can't be materialized; separate
+        # transaction, so the request's objects aren't expired
+        table = ProviderStats.__table__
+        aggregates = provider_stats_select(provider_id)
+        upsert = UPSERTS.get(db.engine.dialect.name)
+        with db.engine.begin() as connection:
+            if upsert is not None:
+                connection.execute(upsert(table).from_select(aggregates.selected_columns.keys(), aggregates)
+                                   .on_conflict_do_nothing(index_elements=[table.c.provider_id]))
+            else:
+                try:
+                    with connection.begin_nested():
+                        connection.execute(insert(table).from_select(aggregates.selected_columns.keys(), aggregates))
+                except IntegrityError:
+                    pass # Materialized concurrently
+            row = connection.execute(select(table).where(table.c.provider_id == provider_id)).one()
+        stats = ProviderStats(**row._asdict())
+    return stats
+
+def bump_provider_stats(provider_id, **deltas):
+    """
+    Adds deltas to a provider's materialized stats in the current transaction.
+    A provider without a row yet gets one computed on the next dashboard view.
+    """
+    if not app.config['PROVIDER_STATS_MATERIALIZED']:
+        return
+    ProviderStats.query.filter_by(provider_id=provider_id).update(
+        {getattr(ProviderStats, column): getattr(ProviderStats, column) + delta for column, delta in deltas.items()},
+        synchronize_session=False)
 
 @app.route('/provider/dashboard')
+@replica_reads
 def provider_dashboard():
     if 'user_id' not in session or session['role'] != 'provider':
         return redirect(url_for('login'))
     
-    check_expired_mous()
+    provider_id = session['user_id']
+    my_visits = IndustrialVisit.query.filter_by(provider_id=provider_id).all()
     
-    my_visits = IndustrialVisit.query.filter_by(provider_id=session['user_id']).all()
-    
-    # Stats Calculation
-    total_visits = len(my_visits)
-    total_applications = 0
-    for v in my_visits:
-        total_applications += len(v.applications)
-        
-    avg_rating = 0
-    total_reviews = 0
-    for v in my_visits:
-        for r in v.reviews:
-            avg_rating += r.rating
-            total_reviews += 1
-    if total_reviews > 0:
-        avg_rating = round(avg_rating / total_reviews, 1)
+    # Stats Calculation, done by the template only when its cached panel is out of date
+    def load_stats():
+        provider_stats = get_provider_stats(provider_id)
+        avg_rating = 0
+        if provider_stats.review_count > 0:
+            avg_rating = round(provider_stats.rating_sum / provider_stats.review_count, 1)
+        return {
+            'total_visits': provider_stats.total_visits,
+            'total_applications': provider_stats.total_applications,
+            'active_mous': MoU.query.filter_by(provider_id=provider_id, status='active').count(),
+            'avg_rating': avg_rating,
+            'review_count': provider_stats.review_count
+        }
     
     # MoU Data
-    mou_requests = MoU.query.filter_by(provider_id=session['user_id'], status='pending').all()
-    active_mous = MoU.query.filter_by(provider_id=session['user_id'], status='active').all()
-    
-    stats = {
-        'total_visits': total_visits,
-        'total_applications': total_applications,
-        'active_mous': len(active_mous),
-        'avg_rating': avg_rating,
-        'review_count': total_reviews
-    }
+    def load_mou_requests():
+        return MoU.query.filter_by(provider_id=provider_id, status='pending').all()
     
     return render_template('dashboard_provider.html', 
                            user=session, 
                            visits=my_visits,
-                           mou_requests=mou_requests,
-                           active_mous=active_mous,
-                           stats=stats)
+                           load_mou_requests=load_mou_requests,
+                           load_stats=load_stats,
+                           versions=version_stamp(user_scope('provider', provider_id)))
 
 @app.route('/admin/dashboard')
+@replica_reads
 def admin_dashboard():
     if 'user_id' not in session or session['role'] != 'admin':
         return redirect(url_for('login'))
@@ -330,14 +615,22 @@ def admin_dashboard():
     total_visits = IndustrialVisit.query.count()
     total_applications = Application.query.count()
     
-    users = User.query.all()
+    user_page = paginate_request(User.query, User.id)
     
-    return render_template('dashboard_admin.html', user=session, users=users, stats={
+    return render_template('dashboard_admin.html', user=session, users=user_page.items, user_page=user_page, stats={
         'users': total_users,
         'visits': total_visits,
         'applications': total_applications
     })
 
+@app.route('/admin/metrics')
+def admin_metrics():
+    if 'user_id' not in session or session['role'] != 'admin':
+        return redirect(url_for('login'))
+    if not app.config['METRICS_ENABLED']:
+        return render_template('404.html'), 404
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/admin/delete_user/<int:user_id>')
 def delete_user(user_id):
     if 'user_id' not in session or session['role'] != 'admin':
@@ -345,14 +638,42 @@ def delete_user(user_id):
     
     user_to_delete = User.query.get_or_404(user_id)
     if user_to_delete.email != 'admin@test.com': # Prevent deleting main admin
-        db.session.delete(user_to_delete)
-        db.session.commit()
+        delete_user_account(user_to_delete)
         flash(f'User {user_to_delete.name} deleted.', 'success')
     else:
         flash('Cannot delete the main admin account.', 'error')
         
     return redirect(url_for('admin_dashboard'))
 
+def delete_user_account(user):
+    """Deletes user with everything they own, and clears it from the derived data and caches."""
+    user_id = user.id
+    visit_ids = [v.id for v in user.visits_created]
+    visit_keywords = set().union(*(extract_keywords(visit_text(v)) for v in user.visits_created))
+    # A student's applications go with them; re-materialize the affected providers' stats
+    affected_providers = {pid for (pid,) in db.session.query(IndustrialVisit.provider_id)
+                          .join(Application, Application.visit_id == IndustrialVisit.id)
+                          .filter(Application.student_id == user_id)}
+    ProviderStats.query.filter(ProviderStats.provider_id.in_(affected_providers)).delete(synchronize_session=False)
+    bump_versions(*deletion_scopes(user))
+    db.session.delete(user)
+    db.session.commit()
+    for visit_id in visit_ids:
+        term_matrix.remove(visit_id)
+    recommendation_cache.invalidate_keywords(visit_keywords)
+    recommendation_cache.invalidate_student(user_id)
+
+def deletion_scopes(user):
+    # Version scopes of every dashboard panel showing something of user's
+    scopes = {VISITS_SCOPE, user_scope(user.role, user.id)}
+    scopes.update(user_scope('provider', pid) for (pid,) in db.session.query(IndustrialVisit.provider_id)
+                  .join(Application, Application.visit_id == IndustrialVisit.id)
+                  .filter(Application.student_id == user.id))
+    for college_id, provider_id in db.session.query(MoU.college_id, MoU.provider_id).filter(
+            (MoU.college_id == user.id) | (MoU.provider_id == user.id)):
+        scopes.update([user_scope('college', college_id), user_scope('provider', provider_id)])
+    return scopes
+
 # --- FEATURE ROUTES ---
 
 @app.route('/visit/create', methods=['GET', 'POST'])
@@ -379,7 +700,12 @@ def create_visit():
                 provider_id=session['user_id']
             )
             db.session.add(new_visit)
+            db.session.flush()
+            index_visit(new_visit)
+            bump_provider_stats(session['user_id'], total_visits=1)
+            bump_versions(user_scope('provider', session['user_id']))
             db.session.commit()
+            term_matrix.upsert(new_visit)
             flash('Opportunity created successfully! Waiting for approval.', 'success')
             return redirect(url_for('provider_dashboard'))
         except Exception as e:
@@ -387,6 +713,45 @@ def create_visit():
             
     return render_template('create_visit.html')
 
+# Visits inserted (and committed) per transaction by the bulk import
+IMPORT_BATCH_SIZE = 1000
+
+@app.route('/visit/import', methods=['GET', 'POST'])
+def import_visits():
+    """
+    Bulk-creates pending visits from an uploaded CSV or NDJSON file with the
+    create form's fields. The file is read as a stream and inserted in
+    batches, each committed with its keyword postings; invalid rows are
+    skipped and reported by line.
+    """
+    if 'user_id' not in session or session['role'] != 'provider':
+        return redirect(url_for('login'))
+    if request.method == 'GET':
+        return render_template('import_visits.html', report=None)
+
+    upload = request.files.get('file')
+    fmt = detect_format(upload.filename if upload else None)
+    if fmt is None:
+        flash('Please upload a .csv, .ndjson or .jsonl file.', 'error')
+        return render_template('import_visits.html', report=None), 400
+
+    provider_id = session['user_id']
+    report = ImportReport()
+    for batch in valid_batches(upload.stream, fmt, report, batch_size=IMPORT_BATCH_SIZE):
+        visits = IndustrialVisit.__table__
+        rows = db.session.execute(
+            insert(visits).returning(visits.c.id, visits.c.title, visits.c.description, visits.c.visit_type,
+                                     visits.c.company_name),
+            [dict(values, company_name=session['name'], provider_id=provider_id, status='pending')
+             for values in batch]).all()
+        index_visits(rows)
+        bump_provider_stats(provider_id, total_visits=len(rows))
+        bump_versions(user_scope('provider', provider_id))
+        db.session.commit()
+        report.imported += len(rows)
+
+    return render_template('import_visits.html', report=report)
+
 @app.route('/visit/approve/<int:visit_id>')
 def approve_visit(visit_id):
     if 'user_id' not in session or session['role'] != 'college':
@@ -394,7 +759,11 @@ def approve_visit(visit_id):
         
     visit = IndustrialVisit.query.get_or_404(visit_id)
     visit.status = 'approved'
+    index_visit(visit)
+    bump_versions(VISITS_SCOPE)
     db.session.commit()
+    term_matrix.upsert(visit)
+    recommendation_cache.invalidate_visit(visit)
     
     notify_user(visit.provider_id, f'Your "{visit.title}" has been approved by {session["name"]}.')
     
@@ -408,13 +777,78 @@ def reject_visit(visit_id):
         
     visit = IndustrialVisit.query.get_or_404(visit_id)
     visit.status = 'rejected'
+    bump_versions(VISITS_SCOPE)
     db.session.commit()
+    term_matrix.upsert(visit)
+    recommendation_cache.invalidate_visit(visit)
     
     notify_user(visit.provider_id, f'Your "{visit.title}" was rejected by {session["name"]}.')
     
     flash(f'Visit "{visit.title}" has been rejected.', 'success')
     return redirect(url_for('college_dashboard'))
 
+# Visits per UPDATE in bulk moderation, well under database parameter limits
+MODERATION_CHUNK_SIZE = 500
+
+@app.route('/visit/moderate', methods=['POST'])
+def moderate_visits():
+    """
+    Approves or rejects the selected pending visits (or all of them) in one
+    transaction: chunked UPDATE ... RETURNING, batched keyword indexing and
+    one notification per affected provider, all committed together.
+    """
+    if 'user_id' not in session or session['role'] != 'college':
+        return redirect(url_for('login'))
+    status = {'approve': 'approved', 'reject': 'rejected'}.get(request.form.get('action'))
+    if status is None:
+        flash('Unknown moderation action.', 'error')
+        return redirect(url_for('college_dashboard'))
+
+    if request.form.get('all_pending'):
+        visit_ids = [vid for (vid,) in db.session.query(IndustrialVisit.id).filter_by(status='pending')]
+    else:
+        visit_ids = request.form.getlist('visit_ids', type=int)
+
+    visits = IndustrialVisit.__table__
+    moderated = []
+    for start in range(0, len(visit_ids), MODERATION_CHUNK_SIZE):
+        chunk = visit_ids[start:start + MODERATION_CHUNK_SIZE]
+        # Only still-pending rows change, so concurrent reviewers can't moderate a visit twice
+        rows = db.session.execute(update(visits)
+                                  .where(visits.c.id.in_(chunk), visits.c.status == 'pending')
+                                  .values(status=status)
+                                  .returning(*visits.c)).all()
+        if status == 'approved':
+            index_visits(rows)
+        moderated.extend(rows)
+    if not moderated:
+        db.session.rollback()
+        flash('No pending visits were selected.', 'info')
+        return redirect(url_for('college_dashboard'))
+    bump_versions(VISITS_SCOPE)
+
+    titles_by_provider = {}
+    for row in moderated:
+        titles_by_provider.setdefault(row.provider_id, []).append(row.title)
+    verb = 'approved' if status == 'approved' else 'rejected'
+    notifications = []
+    for provider_id, titles in titles_by_provider.items():
+        if len(titles) == 1:
+            message = f'Your "{titles[0]}" was {verb} by {session["name"]}.'
+        else:
+            listed = ', '.join(f'"{title}"' for title in titles[:5])
+            more = f' and {len(titles) - 5} more' if len(titles) > 5 else ''
+            message = f'{len(titles)} of your opportunities were {verb} by {session["name"]}: {listed}{more}.'
+        notifications.append((provider_id, message[:500]))
+    # Commits the status changes and index postings together with the notifications
+    notify_users(notifications)
+
+    for row in moderated:
+        term_matrix.upsert(row)
+    recommendation_cache.invalidate_keywords(set().union(*(extract_keywords(visit_text(row)) for row in moderated)))
+    flash(f'{len(moderated)} visits {verb}.', 'success')
+    return redirect(url_for('college_dashboard'))
+
 @app.route('/visit/apply/<int:visit_id>')
 def apply_visit(visit_id):
     if 'user_id' not in session or session['role'] != 'student':
@@ -425,11 +859,19 @@ def apply_visit(visit_id):
     if existing_app:
         flash('You have already applied for this visit.', 'info')
     else:
+        visit = IndustrialVisit.query.get_or_404(visit_id)
         new_app = Application(student_id=session['user_id'], visit_id=visit_id)
         db.session.add(new_app)
-        db.session.commit()
+        bump_provider_stats(visit.provider_id, total_applications=1)
+        bump_versions(user_scope('student', session['user_id']), user_scope('provider', visit.provider_id))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent request applied first (uq_application_student_visit)
+            db.session.rollback()
+            flash('You have already applied for this visit.', 'info')
+            return redirect(url_for('student_dashboard'))
         
-        visit = IndustrialVisit.query.get(visit_id)
         notify_user(visit.provider_id, f'New application for "{visit.title}" by {session["name"]}.', "New Student Application")
         
         # Notify Student as well
@@ -460,6 +902,7 @@ def request_mou():
             else:
                 new_mou = MoU(college_id=session['user_id'], provider_id=provider.id, terms=terms)
                 db.session.add(new_mou)
+                bump_versions(user_scope('college', session['user_id']), user_scope('provider', provider.id))
                 db.session.commit()
                 notify_user(provider.id, f'New MoU request from {session["name"]}.')
                 flash('MoU Request sent to provider.', 'success')
@@ -482,6 +925,7 @@ def approve_mou(mou_id):
     mou.start_date = start_date
     mou.end_date = end_date
     mou.status = 'active'
+    bump_versions(user_scope('college', mou.college_id), user_scope('provider', mou.provider_id))
     db.session.commit()
     
     notify_user(mou.college_id, f'MoU accepted by {session["name"]}. You can now download the agreement.')
@@ -496,52 +940,46 @@ def reject_mou(mou_id):
     mou = MoU.query.get_or_404(mou_id)
     
     mou.status = 'rejected'
+    bump_versions(user_scope('college', mou.college_id), user_scope('provider', mou.provider_id))
     db.session.commit()
     notify_user(mou.college_id, f'MoU rejected by {session["name"]}.')
     flash('MoU Rejected.', 'info')
     return redirect(url_for('provider_dashboard'))
 
 @app.route('/mou/download/<int:mou_id>')
+@replica_reads
 def download_mou(mou_id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
         
-    mou = MoU.query.get_or_404(mou_id)
+    mou = MoU.query.options(joinedload(MoU.college), joinedload(MoU.provider)).get_or_404(mou_id)
     # Check access
     if session['user_id'] not in [mou.college_id, mou.provider_id]:
         flash('Unauthorized access.', 'error')
         return redirect(url_for('index'))
         
-    # Generate PDF
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-    
-    pdf.set_font("Arial", 'B', 16)
-    pdf.cell(200, 10, txt="Memorandum of Understanding", ln=1, align='C')
-    pdf.ln(10)
-    
-    pdf.set_font("Arial", size=12)
-    pdf.cell(200, 10, txt=f"This agreement is made between:", ln=1)
-    pdf.cell(200, 10, txt=f"College: {mou.college.name}", ln=1)
-    pdf.cell(200, 10, txt=f"Provider: {mou.provider.name}", ln=1)
-    pdf.ln(5)
-    
-    pdf.cell(200, 10, txt=f"Valid From: {mou.start_date} To: {mou.end_date}", ln=1)
-    pdf.ln(5)
-    
-    pdf.multi_cell(0, 10, txt=f"Terms of Agreement:\n{mou.terms}")
-    pdf.ln(20)
-    
-    pdf.cell(200, 10, txt="Signed Digitally via Provics Platform", ln=1, align='C')
-    
-    # Save to buffer
-    pdf_buffer = BytesIO()
-    pdf_output = pdf.output(dest='S').encode('latin-1')
-    pdf_buffer.write(pdf_output)
-    pdf_buffer.seek(0)
-    
-    return send_file(pdf_buffer, as_attachment=True, download_name=f'MoU_{mou.id}.pdf', mimetype='application/pdf')
+    # Rendered once per distinct content; repeats are served from disk or answered 304
+    etag, pdf, rendered_at = mou_pdf_cache.open_or_render(mou_fields(mou))
+    return send_file(pdf, as_attachment=True, download_name=f'MoU_{mou.id}.pdf', mimetype='application/pdf',
+                     etag=etag, last_modified=rendered_at, conditional=True)
+
+@app.route('/mou/export')
+@replica_reads
+def export_mous():
+    if 'user_id' not in session or session['role'] not in ('college', 'provider'):
+        return redirect(url_for('login'))
+
+    # Every signed MoU of the user; the fields are collected up front so the stream needs no DB session
+    owner = MoU.college_id if session['role'] == 'college' else MoU.provider_id
+    mous = (MoU.query.options(joinedload(MoU.college), joinedload(MoU.provider))
+            .filter(owner == session['user_id'], MoU.start_date.isnot(None))
+            .order_by(MoU.id).all())
+    entries = [(f'MoU_{mou.id}.pdf', mou_fields(mou)) for mou in mous]
+
+    workers = app.config['PDF_RENDER_WORKERS']
+    stream = stream_zip(entries, mou_pdf_cache, render_pool(workers), window=workers * 2)
+    return Response(stream, mimetype='application/zip',
+                    headers={'Content-Disposition': 'attachment; filename=MoUs.zip'})
 
 # --- REVIEWS ---
 
@@ -556,20 +994,141 @@ def post_review(visit_id):
     # Check if attended (for now, we just check if approved application exists, 
     # ideally check if visit date passed)
     
+    visit = IndustrialVisit.query.get_or_404(visit_id)
     new_review = Review(visit_id=visit_id, student_id=session['user_id'], rating=rating, comment=comment)
     db.session.add(new_review)
+    bump_provider_stats(visit.provider_id, review_count=1, rating_sum=int(rating))
+    bump_versions(user_scope('provider', visit.provider_id))
     db.session.commit()
     
     flash('Thank you for your feedback!', 'success')
     return redirect(url_for('student_dashboard'))
 
+# --- JSON API (for polling) ---
+
+def versioned_json(scopes, load):
+    """
+    JSON response of load() with an ETag made from the scopes' data versions.
+    A request whose If-None-Match still matches gets a 304 after the single
+    version lookup, without load() running.
+    """
+    stamp = f"{request.full_path}|{session['user_id']}|{version_stamp(*scopes)}"
+    etag = hashlib.sha256(stamp.encode('utf-8')).hexdigest()[:32]
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(load())
+    response.set_etag(etag)
+    # Browsers may keep the body but must revalidate it on every poll
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def visit_json(visit):
+    return {'id': visit.id, 'title': visit.title, 'company_name': visit.company_name,
+            'description': visit.description, 'date': visit.date.isoformat(), 'location': visit.location,
+            'visit_type': visit.visit_type, 'status': visit.status}
+
+def page_json(page, items):
+    return {'items': items, 'next_cursor': page.next_cursor, 'prev_cursor': page.prev_cursor,
+            'per_page': page.per_page}
+
+@app.route('/api/notifications')
+@replica_reads
+def api_notifications():
+    if 'user_id' not in session:
+        return jsonify(error='Login required'), 401
+    user_id = session['user_id']
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+
+    def load():
+        counter = NotificationCounter.query.get(user_id)
+        unread = (counter.unread if counter is not None
+                  else Notification.query.filter_by(user_id=user_id, is_read=False).count())
+        recent = (Notification.query.filter_by(user_id=user_id)
+                  .order_by(Notification.created_at.desc()).limit(limit).all())
+        return {'unread_count': unread,
+                'notifications': [{'id': n.id, 'message': n.message, 'is_read': n.is_read,
+                                   'created_at': n.created_at.isoformat()} for n in recent]}
+    return versioned_json([user_scope('notifications', user_id)], load)
+
+@app.route('/api/applications')
+@replica_reads
+def api_applications():
+    if 'user_id' not in session or session['role'] not in ('student', 'provider'):
+        return jsonify(error='Login required'), 401
+    user_id, role = session['user_id'], session['role']
+
+    def load():
+        # A student's own applications, or those to a provider's visits
+        query = Application.query.options(joinedload(Application.visit))
+        if role == 'student':
+            query = query.filter(Application.student_id == user_id)
+        else:
+            query = query.join(IndustrialVisit, Application.visit_id == IndustrialVisit.id).filter(
+                IndustrialVisit.provider_id == user_id)
+        page = paginate_request(query, Application.id)
+        return page_json(page, [{'id': a.id, 'student_id': a.student_id, 'status': a.status,
+                                 'applied_date': a.applied_date.isoformat(), 'visit': visit_json(a.visit)}
+                                for a in page.items])
+    return versioned_json([VISITS_SCOPE, user_scope(role, user_id)], load)
+
+@app.route('/api/visits')
+@replica_reads
+def api_visits():
+    if 'user_id' not in session:
+        return jsonify(error='Login required'), 401
+
+    def load():
+        # Open opportunities, as on the student dashboard
+        query = IndustrialVisit.query.filter_by(status='approved')
+        if request.args.get('type'):
+            query = query.filter_by(visit_type=request.args['type'])
+        page = paginate_request(query, IndustrialVisit.id)
+        return page_json(page, [visit_json(visit) for visit in page.items])
+    return versioned_json([VISITS_SCOPE], load)
+
+@app.route('/notifications/stream')
+def notification_stream():
+    if 'user_id' not in session:
+        return jsonify(error='Login required'), 401
+    channel = notification_channel(session['user_id'])
+    # Checked and taken in one step, so concurrent connects can't overshoot the cap
+    subscription = event_broker.subscribe(channel, limit=app.config['SSE_MAX_STREAMS'])
+    if subscription is None:
+        # An error status would make EventSource give up for good; an empty stream with a
+        # retry hint has it reconnect later, and the page still shows notifications on load
+        retry_ms = app.config['SSE_RETRY_SECONDS'] * 1000
+        return Response(f'retry: {retry_ms}\n\n', mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+    heartbeat, max_seconds = app.config['SSE_HEARTBEAT_SECONDS'], app.config['SSE_MAX_SECONDS']
+
+    def stream():
+        try:
+            yield 'retry: 5000\n\n'
+            deadline = time.monotonic() + max_seconds
+            while time.monotonic() < deadline:
+                try:
+                    message = subscription.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ': keep-alive\n\n' # Also notices clients that went away
+                    continue
+                yield f'event: notification\ndata: {message}\n\n'
+        finally:
+            event_broker.unsubscribe(channel, subscription)
+
+    # No DB work happens in the stream, so it holds no connection while idle
+    response = Response(stream(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Also frees the slot if the client left before the stream started
+    response.call_on_close(lambda: event_broker.unsubscribe(channel, subscription))
+    return response
+
 # --- AUTH EXTRAS ---
 
 @app.route('/forgot_password', methods=['GET', 'POST'])
 def forgot_password():
     if request.method == 'POST':
-        email = request.form['email']
-        user = User.query.filter_by(email=email).first()
+        email = request.form['email'].strip().lower()
+        user = User.query.filter(func.lower(User.email) == email).first()
         if user:
             # Generate OTP
             reset_otp = str(random.randint(100000, 999999))
@@ -620,9 +1179,9 @@ def reset_new_password():
             flash('Password must be at least 6 characters', 'error')
         else:
             email = session['reset_email']
-            user = User.query.filter_by(email=email).first()
+            user = User.query.filter(func.lower(User.email) == email).first()
             if user:
-                user.password_hash = generate_password_hash(password)
+                user.password_hash = hash_password(password, app.config['PASSWORD_HASH_METHOD'])
                 db.session.commit()
                 
                 # Cleanup
@@ -691,8 +1250,7 @@ def verify_delete_account():
             
             if user:
                 user_email = user.email
-                db.session.delete(user)
-                db.session.commit()
+                delete_user_account(user)
             else:
                 # User might already be gone, fallback to session email if available
                 user_email = session.get('delete_otp_email')
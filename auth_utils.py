@@ -0,0 +1,54 @@
+import threading
+from functools import lru_cache
+from werkzeug.security import check_password_hash, generate_password_hash
+from cache_utils import TTLCache
+
+
+@lru_cache(maxsize=None)
+def _method_prefix(method):
+    # Werkzeug fills in default parameters ("scrypt" -> "scrypt:32768:8:1"); compare in that form
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
+def hash_password(password, method):
+    return generate_password_hash(password, method=method)
+
+def needs_rehash(password_hash, method):
+    """True if the stored hash was made with other parameters than method."""
+    return password_hash.split('$', 1)[0] != _method_prefix(method)
+
+def verify_password(user, password, method):
+    """
+    Checks password against the user's stored hash. On success, a hash made
+    with an outdated method is replaced in the session (the caller commits).
+    """
+    if not user.password_hash or not check_password_hash(user.password_hash, password):
+        return False
+    if needs_rehash(user.password_hash, method):
+        user.password_hash = hash_password(password, method)
+    return True
+
+
+class FailedLoginCache:
+    """
+    Counts failed logins per key (an account email, a client address) so
+    bursts can be turned away before any hashing. Counts are per process;
+    a key's count expires `window` seconds after its last failure.
+    """
+
+    def __init__(self, max_failures=5, window=300):
+        self.max_failures = max_failures
+        self._counts = TTLCache(maxsize=100000, ttl=window)
+        self._lock = threading.Lock()
+
+    def blocked(self, key):
+        return self._counts.get(key, 0) >= self.max_failures
+
+    def record_failure(self, key):
+        with self._lock: # Concurrent failures must not overwrite each other's increment
+            self._counts.set(key, self._counts.get(key, 0) + 1)
+
+    def reset(self, key):
+        self._counts.delete(key)
+
+    def clear(self):
+        self._counts.clear()
@@ -0,0 +1,251 @@
+"""
+Latency benchmark of the hot routes.
+
+Seeds a synthetic dataset with populate_demo_data's bulk loader (once; an
+already seeded database is reused), then times each route through the Flask
+test client and prints JSON with p50/p95 latency and SQL query counts per
+route, for comparing releases.
+
+    python benchmark.py --scale 100   # 100k students, 10k visits, 1M applications, 1M notifications
+    python benchmark.py --database postgresql://localhost/provics_bench --requests 200 --output bench.json
+    python benchmark.py --scale 1 --streams 2000   # idle notification streams one worker can hold
+
+Runs against its own database (--database, default a file in the temp
+directory), never the app's.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import selectors
+import socket
+import sys
+import threading
+import tempfile
+import time
+from datetime import datetime
+
+
+def percentile(values, pct):
+    # Nearest-rank percentile
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def run_benchmark(app, requests_per_route):
+    """Times each hot route. Returns {route: stats} for the JSON report."""
+    from sqlalchemy import event, select
+    from app import db, mou_pdf_cache, notification_header_cache
+    from models import User, IndustrialVisit, MoU
+
+    with app.app_context():
+        def ids(role, limit):
+            return db.session.execute(select(User.id).where(User.role == role).order_by(User.id)
+                                      .limit(limit)).scalars().all()
+        n = requests_per_route
+        users = {role: ids(role, n) for role in ('student', 'provider', 'college', 'admin')}
+        mous = db.session.execute(select(MoU.id, MoU.college_id).where(MoU.start_date.isnot(None))
+                                  .order_by(MoU.id).limit(n)).all()
+        open_visits = db.session.execute(select(IndustrialVisit.id).where(IndustrialVisit.status == 'approved')
+                                         .order_by(IndustrialVisit.id.desc()).limit(n)).scalars().all()
+        engine = db.engine
+
+    # (route, url of the i-th request, user of the i-th request); users rotate so
+    # per-user caches don't turn every request after the first into a hit
+    routes = [
+        ('student_dashboard', lambda i: '/student/dashboard', lambda i: users['student'][i % len(users['student'])]),
+        ('provider_dashboard', lambda i: '/provider/dashboard', lambda i: users['provider'][i % len(users['provider'])]),
+        ('college_dashboard', lambda i: '/college/dashboard', lambda i: users['college'][i % len(users['college'])]),
+        ('admin_dashboard', lambda i: '/admin/dashboard', lambda i: users['admin'][0]),
+        ('download_mou', lambda i: f'/mou/download/{mous[i % len(mous)].id}', lambda i: mous[i % len(mous)].college_id),
+        # A different student and visit every time, so each request is a real insert
+        ('apply_visit', lambda i: f'/visit/apply/{open_visits[i % len(open_visits)]}',
+         lambda i: users['student'][(i * 7 + 1) % len(users['student'])]),
+    ]
+    roles = {'student_dashboard': 'student', 'provider_dashboard': 'provider', 'college_dashboard': 'college',
+             'admin_dashboard': 'admin', 'download_mou': 'college', 'apply_visit': 'student'}
+
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(engine, 'before_cursor_execute', record)
+
+    client = app.test_client()
+    results = {}
+    app_cache_dir = mou_pdf_cache.directory
+    with tempfile.TemporaryDirectory() as cache_dir:
+        mou_pdf_cache.directory = cache_dir # Start cold, without touching the app's cache
+        for name, url, user_id in routes:
+            latencies, queries, statuses = [], [], {}
+            for i in range(-1, n): # The first request warms up and isn't counted
+                with client.session_transaction() as sess:
+                    sess.update(user_id=user_id(max(i, 0)), role=roles[name], name=name)
+                notification_header_cache.clear()
+                statements.clear()
+                start = time.perf_counter()
+                response = client.get(url(max(i, 0)))
+                response.get_data()
+                elapsed = time.perf_counter() - start
+                if i < 0:
+                    continue
+                latencies.append(elapsed * 1000)
+                queries.append(len(statements))
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            results[name] = {
+                'requests': n,
+                'p50_ms': round(percentile(latencies, 50), 2),
+                'p95_ms': round(percentile(latencies, 95), 2),
+                'max_ms': round(max(latencies), 2),
+                'queries_p50': percentile(queries, 50),
+                'queries_max': max(queries),
+                'status_codes': {str(code): count for code, count in sorted(statuses.items())},
+            }
+    mou_pdf_cache.directory = app_cache_dir
+    event.remove(engine, 'before_cursor_execute', record)
+    return results
+
+
+def open_stream(address, cookie):
+    # Raw socket, so thousands of streams don't need thousands of client threads
+    sock = socket.create_connection(address, timeout=10)
+    sock.sendall(f"GET /notifications/stream HTTP/1.1\r\nHost: localhost\r\nCookie: {cookie}\r\n\r\n".encode())
+    received = b''
+    while b'retry:' not in received:
+        chunk = sock.recv(4096)
+        if not chunk:
+            raise ConnectionError(received.split(b'\r\n', 1)[0].decode() or 'connection closed')
+        received += chunk
+    return sock
+
+def rss_mb():
+    # Peak resident set size of this process (kilobytes on Linux)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run_stream_benchmark(app, streams):
+    """
+    Opens up to `streams` idle notification streams against one threaded
+    worker in this process, then times one notification reaching all of them.
+    """
+    from sqlalchemy import select
+    from werkzeug.serving import make_server
+    from app import db, notify_users
+    from models import User
+
+    with app.app_context():
+        user_ids = db.session.execute(select(User.id).order_by(User.id).limit(streams)).scalars().all()
+    serializer = app.session_interface.get_signing_serializer(app)
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard)) # Two sockets per stream
+
+    saved = app.config['SSE_MAX_STREAMS'], app.config['SSE_HEARTBEAT_SECONDS']
+    app.config.update(SSE_MAX_STREAMS=streams, SSE_HEARTBEAT_SECONDS=3600)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    rss_before, threads_before = rss_mb(), threading.active_count()
+    sockets, error = [], None
+    start = time.perf_counter()
+    for i in range(streams):
+        user_id = user_ids[i % len(user_ids)]
+        cookie = f"{app.config['SESSION_COOKIE_NAME']}={serializer.dumps({'user_id': user_id, 'role': 'student'})}"
+        try:
+            sockets.append((user_id, open_stream(server.server_address, cookie)))
+        except OSError as e:
+            error = str(e)
+            break
+    open_seconds = time.perf_counter() - start
+    rss_after = rss_mb()
+
+    # One notification per streamed user; time until every stream has its event
+    start = time.perf_counter()
+    with app.app_context():
+        notify_users([(user_id, 'Benchmark event') for user_id in {user_id for user_id, _ in sockets}])
+    selector = selectors.DefaultSelector()
+    for _, sock in sockets:
+        selector.register(sock, selectors.EVENT_READ)
+    waiting = len(sockets)
+    while waiting:
+        events = selector.select(timeout=30)
+        if not events:
+            break
+        for key, _ in events:
+            if b'event: notification' in key.fileobj.recv(4096):
+                selector.unregister(key.fileobj)
+                waiting -= 1
+    fanout_seconds = time.perf_counter() - start
+
+    for _, sock in sockets:
+        sock.close()
+    server.shutdown()
+    app.config['SSE_MAX_STREAMS'], app.config['SSE_HEARTBEAT_SECONDS'] = saved
+    resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+    return {
+        'streams_requested': streams,
+        'streams_open': len(sockets),
+        'error': error,
+        'open_seconds': round(open_seconds, 2),
+        'threads': threading.active_count() - threads_before,
+        'peak_rss_mb_per_1000_streams': round((rss_after - rss_before) * 1000 / max(len(sockets), 1), 2),
+        'fanout_ms': round(fanout_seconds * 1000, 2),
+        'missed_events': waiting,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the Provics hot routes.")
+    parser.add_argument('--database', default='sqlite:///' + os.path.join(tempfile.gettempdir(), 'provics_benchmark.db'),
+                        help="database URL to seed and benchmark (never point this at real data)")
+    parser.add_argument('--scale', type=float, default=100, help="dataset size, see populate_demo_data.py")
+    parser.add_argument('--requests', type=int, default=100, help="timed requests per route")
+    parser.add_argument('--streams', type=int, help="benchmark this many idle notification streams instead of the routes")
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    # Point the app at the benchmark database before it is imported (FORCE_DATABASE_URL,
+    # unlike DATABASE_URL, isn't replaced by the one in .env)
+    os.environ['FORCE_DATABASE_URL'] = args.database
+    from app import app, db
+    from sqlalchemy.engine import make_url
+
+    def normalized_url(url):
+        # app.py rewrites the postgres:// scheme Heroku hands out
+        url = make_url(url)
+        return url.set(drivername='postgresql') if url.drivername == 'postgres' else url
+
+    configured = normalized_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    if configured != normalized_url(args.database):
+        sys.exit(f"[FAILED] The app is configured for {configured.render_as_string()}, "
+                 f"not {make_url(args.database).render_as_string()}; refusing to benchmark it")
+    from populate_demo_data import populate_bulk
+    from models import User, IndustrialVisit, Application, MoU, Review, Notification
+
+    with app.app_context():
+        if db.session.query(User.id).first() is None:
+            started = time.perf_counter()
+            with db.engine.begin() as connection:
+                dataset = populate_bulk(connection, args.scale)
+            print(f"[SUCCESS] Seeded {dataset} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        else:
+            print("[INFO] Reusing the already seeded benchmark database", file=sys.stderr)
+        counts = {model.__tablename__: model.query.count()
+                  for model in (User, IndustrialVisit, Application, Review, MoU, Notification)}
+        db.session.remove()
+
+    report = {
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'python': platform.python_version(),
+        'database': args.database.split(':', 1)[0],
+        'dataset': counts,
+    }
+    if args.streams:
+        report['streams'] = run_stream_benchmark(app, args.streams)
+    else:
+        report['routes'] = run_benchmark(app, args.requests)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
@@ -0,0 +1,76 @@
+"""
+Builds the production static files into staticfiles/.
+
+Every file under static/ (except user uploads) is copied under a
+content-hashed name, e.g. css/style.css -> css/style.3f9c1a2b7d4e.css, with
+.gz and .br variants of text files next to it. staticfiles/manifest.json
+maps original names to hashed ones; app.py rewrites url_for('static', ...)
+through it, and WhiteNoise serves the hashed files as immutable.
+
+    python build_static.py
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+SOURCE_DIR = os.path.join(BASE_DIR, 'static')
+OUTPUT_DIR = os.path.join(BASE_DIR, 'staticfiles')
+MANIFEST_NAME = 'manifest.json'
+# User content, served by Flask straight from static/
+SKIP_DIRS = {'uploads'}
+# Images and fonts are already compressed
+COMPRESSIBLE = {'.css', '.js', '.svg', '.txt', '.html', '.json', '.map', '.xml', '.ico'}
+HASH_LENGTH = 12
+
+
+def hashed_name(path, data):
+    root, ext = os.path.splitext(path)
+    return f"{root}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}"
+
+def write_variants(path, data):
+    """Writes path plus .gz/.br variants when they are actually smaller."""
+    with open(path, 'wb') as f:
+        f.write(data)
+    if os.path.splitext(path)[1] not in COMPRESSIBLE:
+        return
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(compressed) < len(data):
+        with open(path + '.gz', 'wb') as f:
+            f.write(compressed)
+    if brotli is not None:
+        compressed = brotli.compress(data)
+        if len(compressed) < len(data):
+            with open(path + '.br', 'wb') as f:
+                f.write(compressed)
+
+def build(source_dir=SOURCE_DIR, output_dir=OUTPUT_DIR):
+    """Rebuilds output_dir from source_dir. Returns the manifest."""
+    shutil.rmtree(output_dir, ignore_errors=True)
+    manifest = {}
+    for directory, subdirs, files in os.walk(source_dir):
+        subdirs[:] = [d for d in subdirs if os.path.relpath(os.path.join(directory, d), source_dir) not in SKIP_DIRS]
+        for name in files:
+            with open(os.path.join(directory, name), 'rb') as f:
+                data = f.read()
+            original = os.path.relpath(os.path.join(directory, name), source_dir).replace(os.sep, '/')
+            hashed = hashed_name(original, data)
+            os.makedirs(os.path.join(output_dir, os.path.dirname(original)), exist_ok=True)
+            write_variants(os.path.join(output_dir, hashed), data)
+            manifest[original] = hashed
+
+    with open(os.path.join(output_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+if __name__ == '__main__':
+    if brotli is None:
+        print("[WARNING] brotli not installed; only gzip variants will be written")
+    manifest = build()
+    print(f"[SUCCESS] Built {len(manifest)} static files into {os.path.relpath(OUTPUT_DIR)}")
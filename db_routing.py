@@ -0,0 +1,73 @@
+"""
+Read-replica routing for db.session.
+
+With a 'replica' bind configured (REPLICA_DATABASE_URL), SELECTs issued
+while replica reads are on (the @replica_reads views and use_replica()
+blocks) go to the replica. Everything else goes to the primary: writes,
+flushes, SELECT ... FOR UPDATE, and every read of a session that has
+committed a write. A browser that just wrote is also pinned to the
+primary for REPLICA_PIN_SECONDS, so the page it is redirected to shows
+its own changes despite replication lag. Without a replica bind nothing
+changes.
+"""
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app, g, has_request_context, session as flask_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql import Select
+
+REPLICA_BIND = 'replica'
+
+
+class RoutingSession(Session):
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._reads_from_replica(clause):
+            return self._db.engines[REPLICA_BIND]
+        primary = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if self._flushing or (clause is not None and not isinstance(clause, Select)):
+            self.info['wrote'] = True
+        return primary
+
+    def _reads_from_replica(self, clause):
+        if not (has_request_context() and g.get('_replica_reads')):
+            return False
+        if REPLICA_BIND not in self._db.engines or self._flushing or self.info.get('pinned'):
+            return False
+        if not isinstance(clause, Select) or clause._for_update_arg is not None:
+            return False
+        return flask_session.get('_primary_until', 0) < time.time()
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _pin_after_write(session):
+    # Read-your-writes: this session and, for a moment, this browser stay on the primary
+    if session.info.pop('wrote', False):
+        session.info['pinned'] = True
+        if has_request_context() and REPLICA_BIND in session._db.engines:
+            flask_session['_primary_until'] = time.time() + current_app.config['REPLICA_PIN_SECONDS']
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _forget_rolled_back_write(session):
+    session.info.pop('wrote', None)
+
+
+@contextmanager
+def use_replica():
+    """Routes the block's plain SELECTs to the replica, if there is one."""
+    previous = g.get('_replica_reads', False)
+    g._replica_reads = True
+    try:
+        yield
+    finally:
+        g._replica_reads = previous
+
+def replica_reads(view):
+    """Decorator for views that only read (lazy cache fills on their own connection are fine)."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with use_replica():
+            return view(*args, **kwargs)
+    return wrapper
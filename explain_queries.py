@@ -0,0 +1,129 @@
+"""
+Prints the database query plan of each dashboard query, first without the
+indexes added by migrations 4-7 ("before") and then with them ("after").
+
+The "before" plans are taken inside a transaction that drops the indexes and
+is rolled back, so the database is left untouched. Until the rollback that
+transaction locks the tables, though: on PostgreSQL, DROP INDEX takes an
+ACCESS EXCLUSIVE lock that blocks every query on them. Run it against a
+copy of the database; on anything but SQLite it refuses unless told the
+database is one.
+
+    python explain_queries.py
+    python explain_queries.py --user-id 42
+    DATABASE_URL=postgresql://.../provics_copy python explain_queries.py --copy
+"""
+import argparse
+import os
+import sys
+from datetime import date
+from sqlalchemy import func, select
+
+# Explaining must not migrate the database as a side effect
+os.environ.setdefault('AUTO_MIGRATE', 'False')
+from app import app, db
+from models import User, IndustrialVisit, Application, MoU, Notification, Review, VisitKeyword
+
+PACK_INDEXES = [
+    'ix_industrial_visit_status_type_id',
+    'ix_industrial_visit_status_id',
+    'ix_industrial_visit_provider_id',
+    'ix_industrial_visit_status_date',
+    'ix_application_visit_id',
+    'ix_review_visit_id',
+    'ix_notification_user_read_created',
+    'ix_mou_college_status',
+    'ix_mou_provider_status',
+    'ix_mou_status_end_date',
+    'uq_application_student_visit',
+    'ix_user_email_lower',
+]
+
+
+def dashboard_queries(user_id):
+    today = date.today()
+    return [
+        ("student: browse approved visits by type (keyset page)",
+         select(IndustrialVisit).where(IndustrialVisit.status == 'approved', IndustrialVisit.visit_type == 'Internship',
+                                       IndustrialVisit.id > 1000).order_by(IndustrialVisit.id).limit(21)),
+        ("student: my applications",
+         select(Application).where(Application.student_id == user_id)),
+        ("student: recommendation postings",
+         select(VisitKeyword.visit_id, func.count()).where(VisitKeyword.keyword.in_(['python', 'flask']))
+         .group_by(VisitKeyword.visit_id)),
+        ("student: apply duplicate check",
+         select(Application).where(Application.student_id == user_id, Application.visit_id == 1)),
+        ("college: pending visits (keyset page)",
+         select(IndustrialVisit).where(IndustrialVisit.status == 'pending', IndustrialVisit.id > 1000)
+         .order_by(IndustrialVisit.id).limit(21)),
+        ("college: MoUs by status",
+         select(func.count()).select_from(MoU).where(MoU.college_id == user_id, MoU.status == 'active')),
+        ("provider: my visits",
+         select(IndustrialVisit).where(IndustrialVisit.provider_id == user_id)),
+        ("provider: application count",
+         select(func.count(Application.id)).join(IndustrialVisit, Application.visit_id == IndustrialVisit.id)
+         .where(IndustrialVisit.provider_id == user_id)),
+        ("provider: rating aggregate",
+         select(func.count(Review.id), func.sum(Review.rating)).join(IndustrialVisit, Review.visit_id == IndustrialVisit.id)
+         .where(IndustrialVisit.provider_id == user_id)),
+        ("provider: pending MoU requests",
+         select(MoU).where(MoU.provider_id == user_id, MoU.status == 'pending')),
+        ("login: user by email",
+         select(User).where(func.lower(User.email) == 'anna@test.com')),
+        ("admin: users (keyset page)",
+         select(User).where(User.id > 1000).order_by(User.id).limit(21)),
+        ("header: unread notifications",
+         select(func.count()).select_from(Notification).where(Notification.user_id == user_id,
+                                                              Notification.is_read == False)),
+        ("header: recent notifications",
+         select(Notification).where(Notification.user_id == user_id)
+         .order_by(Notification.created_at.desc()).limit(5)),
+        ("sweeper: expired MoUs",
+         select(MoU.id).where(MoU.status == 'active', MoU.end_date < today)),
+        ("sweeper: past visits",
+         select(IndustrialVisit.id).where(IndustrialVisit.status == 'approved', IndustrialVisit.date < today)),
+    ]
+
+def explain(connection, statement):
+    compiled = statement.compile(dialect=connection.dialect, compile_kwargs={'render_postcompile': True})
+    if connection.dialect.name == 'sqlite':
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).fetchall()
+        return [row[-1] for row in rows]
+    rows = connection.exec_driver_sql(f"EXPLAIN {compiled}", compiled.params).fetchall()
+    return [row[0] for row in rows]
+
+def print_plans(connection, queries, label):
+    print(f"===== {label} =====")
+    for name, statement in queries:
+        print(f"-- {name}")
+        for line in explain(connection, statement):
+            print(f"   {line}")
+    print()
+
+def main(user_id, copy=False):
+    queries = dashboard_queries(user_id)
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite' and not copy:
+            sys.exit(f"[FAILED] Dropping indexes would lock the tables of {db.engine.url.render_as_string()}; "
+                     "run against a copy of the database with --copy")
+        with db.engine.connect() as connection:
+            transaction = connection.begin()
+            if connection.dialect.name == 'sqlite':
+                # pysqlite only opens transactions for DML; make the DROPs below undoable
+                connection.exec_driver_sql("BEGIN")
+            for name in PACK_INDEXES:
+                connection.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+            print_plans(connection, queries, "BEFORE (without index pack)")
+            transaction.rollback()
+
+        with db.engine.connect() as connection:
+            print_plans(connection, queries, "AFTER (with index pack)")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Print dashboard query plans before and after the index pack.")
+    parser.add_argument('--user-id', type=int, default=1, help="user id to plug into per-user queries")
+    parser.add_argument('--copy', action='store_true',
+                        help="the database is a disposable copy, so its tables may be locked (needed beyond SQLite)")
+    args = parser.parse_args()
+    main(args.user_id, copy=args.copy)
@@ -0,0 +1,89 @@
+import multiprocessing
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pdf_utils import render_mou_pdf
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def render_pool(max_workers):
+    """
+    The process pool that renders PDFs for exports, shared by all requests of
+    this worker so concurrent exports can't use more than max_workers cores.
+    Created on first use, after any pre-fork of the web server. Children are
+    started by a forkserver (spawn where there is none): forking this
+    multi-threaded process could copy a lock another thread holds into the
+    child, which then deadlocks on it.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(method))
+    return _pool
+
+
+class _ZipStream:
+    """Write-only file object the ZipFile writes into; drain() hands back what was written since."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _rendered_pdfs(entries, cache, pool, window):
+    """
+    Yields (filename, pdf bytes) in entry order. Cache misses are rendered in
+    the pool, with at most `window` entries in flight per export.
+    """
+    pending = deque()
+
+    def finish():
+        filename, key, fields, job = pending.popleft()
+        if isinstance(job, Future):
+            data = job.result()
+            cache.put(key, data)
+        else:
+            try:
+                with open(job, 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                data = render_mou_pdf(fields) # Evicted since the lookup
+        return filename, data
+
+    for filename, fields in entries:
+        key = cache.key(fields)
+        job = cache.get(key) or pool.submit(render_mou_pdf, fields)
+        pending.append((filename, key, fields, job))
+        if len(pending) >= window:
+            yield finish()
+    while pending:
+        yield finish()
+
+def stream_zip(entries, cache, pool, window=4):
+    """
+    Generator of ZIP archive bytes holding a PDF per (filename, fields) entry.
+    Each file is sent as soon as it is rendered, so the archive is never held
+    in memory. PDFs are already compressed, so entries are stored as-is.
+    """
+    stream = _ZipStream()
+    # The stream isn't seekable, so ZipFile writes sizes after each file's data
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for filename, data in _rendered_pdfs(entries, cache, pool, window):
+            archive.writestr(filename, data)
+            yield stream.drain()
+    yield stream.drain()
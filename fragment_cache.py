@@ -0,0 +1,104 @@
+"""
+{% cache %} tag for caching rendered template fragments.
+
+    {% cache 'college-mous', session['user_id'], versions %}
+        ... expensive markup ...
+    {% endcache %}
+
+The arguments make up the key: a fragment name, the user and a data version
+stamp (version_utils.version_stamp), so a write to the panel's data changes
+the key instead of having to find and delete cached copies. Data the body
+needs should be loaded inside it (e.g. {% set stats = load_stats() %}), so
+a hit skips the queries as well as the rendering.
+
+Backends (FRAGMENT_CACHE): 'memory', an LRU per worker process; 'file', a
+directory shared by the workers on one host; 'none' renders every time.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from cache_utils import TTLCache
+
+
+class FileFragmentCache:
+    """Fragments as files named by key hash, expiring ttl seconds after being written."""
+
+    def __init__(self, directory, ttl=300):
+        self.directory = directory
+        self.ttl = ttl
+
+    def path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.html')
+
+    def get(self, key, default=None):
+        path = self.path(key)
+        try:
+            if os.path.getmtime(path) + self.ttl < time.time():
+                os.remove(path)
+                return default
+            with open(path, encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return default
+
+    def set(self, key, value):
+        os.makedirs(self.directory, exist_ok=True)
+        # Write aside and rename, so other workers never read half a fragment
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(value)
+        os.replace(tmp_path, self.path(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def make_fragment_cache(backend, directory, ttl):
+    """Builds the FRAGMENT_CACHE backend; None means caching is off."""
+    if backend == 'memory':
+        return TTLCache(maxsize=10000, ttl=ttl)
+    if backend == 'file':
+        return FileFragmentCache(directory, ttl=ttl)
+    if backend == 'none':
+        return None
+    raise ValueError(f"Unknown FRAGMENT_CACHE backend: {backend!r}")
+
+
+class FragmentCacheExtension(Extension):
+    """Adds {% cache key, ... %}...{% endcache %}; set environment.fragment_cache to a backend."""
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key_parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key_parts.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        call = self.call_method('_render', [nodes.List(key_parts)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render(self, key_parts, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        key = ':'.join(str(part) for part in key_parts)
+        html = cache.get(key)
+        if html is None:
+            html = str(caller())
+            cache.set(key, html)
+        return Markup(html)
@@ -0,0 +1,107 @@
+"""
+Parsing and validation for bulk visit imports (CSV or NDJSON uploads).
+
+Rows are read from the uploaded file one at a time and handed out in
+batches, and only the first MAX_REPORTED_ERRORS errors are kept, so memory
+stays flat however long the file is.
+"""
+import codecs
+import csv
+import json
+from datetime import datetime
+
+VISIT_TYPES = ('Industrial Visit', 'Internship', 'Mentorship')
+# Column -> maximum length (None: unlimited text)
+FIELDS = {'title': 200, 'description': None, 'date': None, 'location': 200, 'visit_type': 50}
+FORMATS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportReport:
+    """Counts of an import, with the first max_errors row errors as (line, message)."""
+
+    def __init__(self, max_errors=MAX_REPORTED_ERRORS):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self.max_errors = max_errors
+
+    def add_error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append((line, message))
+
+    @property
+    def unreported(self):
+        return self.failed - len(self.errors)
+
+
+def detect_format(filename):
+    for extension, fmt in FORMATS.items():
+        if (filename or '').lower().endswith(extension):
+            return fmt
+    return None
+
+def read_rows(stream, fmt):
+    """Yields (line, row dict or None, error) from a binary stream, one row at a time."""
+    text = codecs.getreader('utf-8-sig')(stream) # Tolerates the BOM spreadsheet exports add
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            if None in row:
+                yield reader.line_num, None, "More values than columns"
+            else:
+                yield reader.line_num, row, None
+        return
+    for line, raw in enumerate(text, start=1):
+        if not raw.strip():
+            continue
+        try:
+            row = json.loads(raw)
+        except ValueError as e:
+            yield line, None, f"Invalid JSON: {e}"
+            continue
+        if isinstance(row, dict):
+            yield line, row, None
+        else:
+            yield line, None, "Expected a JSON object"
+
+def validate_visit(row):
+    """Returns (values, None) for a valid row, or (None, message)."""
+    values = {}
+    for field, max_length in FIELDS.items():
+        value = row.get(field)
+        value = '' if value is None else str(value).strip()
+        if not value and field != 'visit_type':
+            return None, f"Missing {field}"
+        if max_length and len(value) > max_length:
+            return None, f"{field} is longer than {max_length} characters"
+        values[field] = value
+    try:
+        values['date'] = datetime.strptime(values['date'], '%Y-%m-%d').date()
+    except ValueError:
+        return None, f"Invalid date {values['date']!r}, expected YYYY-MM-DD"
+    values['visit_type'] = values['visit_type'] or VISIT_TYPES[0]
+    if values['visit_type'] not in VISIT_TYPES:
+        return None, f"Invalid visit_type {values['visit_type']!r}, expected one of {', '.join(VISIT_TYPES)}"
+    return values, None
+
+def valid_batches(stream, fmt, report, batch_size=1000):
+    """Yields lists of up to batch_size validated rows; invalid rows go to report."""
+    batch = []
+    try:
+        for line, row, error in read_rows(stream, fmt):
+            values = None
+            if error is None:
+                values, error = validate_visit(row)
+            if error is not None:
+                report.add_error(line, error)
+                continue
+            batch.append(values)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    except (csv.Error, UnicodeDecodeError) as e:
+        report.add_error(None, f"Could not read the rest of the file: {e}")
+    if batch:
+        yield batch
@@ -0,0 +1,92 @@
+"""
+Delivers emails queued in the EmailOutbox table.
+
+Runs as its own process (see Procfile) so web requests never wait on SMTP:
+
+    python mail_worker.py           # poll forever
+    python mail_worker.py --once    # drain everything due, then exit
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+from flask_mail import Message
+from app import app, db, mail
+from models import EmailOutbox
+from metrics import smtp_seconds, timed_smtp
+
+
+def retry_delay(attempts):
+    # 30s, 60s, 120s, ... capped at MAIL_RETRY_MAX_SECONDS
+    delay = app.config['MAIL_RETRY_BASE_SECONDS'] * 2 ** (attempts - 1)
+    return timedelta(seconds=min(delay, app.config['MAIL_RETRY_MAX_SECONDS']))
+
+def schedule_retry(email, error):
+    email.attempts += 1
+    email.last_error = error
+    if email.attempts >= app.config['MAIL_MAX_ATTEMPTS']:
+        email.status = 'failed'
+        print(f"[FAILED] Giving up on email {email.id} to {email.to_email}: {error}")
+    else:
+        email.next_attempt_at = datetime.utcnow() + retry_delay(email.attempts)
+
+def drain_outbox(batch_size=100):
+    """
+    Sends due emails over a single SMTP connection. Returns how many were sent.
+    Must run inside an app context.
+    """
+    sent = 0
+    while True:
+        due = (EmailOutbox.query
+               .filter(EmailOutbox.status == 'pending', EmailOutbox.next_attempt_at <= datetime.utcnow())
+               .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id)
+               .limit(batch_size)
+               .with_for_update(skip_locked=True)
+               .all())
+        if not due:
+            return sent
+
+        handled = set()
+        try:
+            with mail.connect() as connection:
+                for email in due:
+                    handled.add(email.id)
+                    try:
+                        sender = app.config['MAIL_USERNAME'] or app.config['MAIL_DEFAULT_SENDER']
+                        with timed_smtp('send'):
+                            connection.send(Message(subject=email.subject, recipients=[email.to_email],
+                                                    body=email.body, sender=sender))
+                        email.status = 'sent'
+                        email.sent_at = datetime.utcnow()
+                        sent += 1
+                    except Exception as e:
+                        schedule_retry(email, str(e))
+        except Exception as e:
+            # Could not connect (or the server hung up): retry whatever wasn't sent
+            print(f"[FAILED] SMTP connection error: {str(e)}")
+            for email in due:
+                if email.id not in handled:
+                    schedule_retry(email, str(e))
+        db.session.commit()
+
+def run(poll_interval=5):
+    with app.app_context():
+        print("[WORKER] Mail worker started")
+        while True:
+            smtp_before = smtp_seconds.total('send')
+            sent = drain_outbox()
+            if sent:
+                print(f"[SUCCESS] Sent {sent} emails ({smtp_seconds.total('send') - smtp_before:.2f}s in SMTP)")
+            db.session.remove()
+            time.sleep(poll_interval)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Deliver queued Provics emails.")
+    parser.add_argument('--once', action='store_true', help="drain due emails and exit")
+    parser.add_argument('--interval', type=float, default=5, help="seconds between polls")
+    args = parser.parse_args()
+
+    if args.once:
+        with app.app_context():
+            print(f"[SUCCESS] Sent {drain_outbox()} emails")
+    else:
+        run(args.interval)
@@ -0,0 +1,154 @@
+"""
+Opt-in request instrumentation (METRICS_ENABLED=True).
+
+Per request it records the SQL query count and time, template render time,
+SMTP time and total time. These are sent back in a Server-Timing header and
+added to per-endpoint histograms, which render_prometheus() exposes in the
+Prometheus text format. Histograms are per process: with several web
+workers, each one reports its own.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Seconds; Prometheus' default buckets
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with one series per label value."""
+
+    def __init__(self, name, help_text, buckets, label='endpoint'):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.label = label
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def total(self, label_value):
+        """Sum of all values observed for label_value."""
+        with self._lock:
+            series = self._series.get(label_value)
+            return series['sum'] if series else 0.0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_value, series in sorted(self._series.items()):
+                label = f'{self.label}="{_escape(label_value)}"'
+                for bound, count in zip(self.buckets, series['buckets']):
+                    lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {series["count"]}')
+                lines.append(f'{self.name}_sum{{{label}}} {series["sum"]}')
+                lines.append(f'{self.name}_count{{{label}}} {series["count"]}')
+        return lines
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+request_seconds = Histogram('provics_request_duration_seconds', "Request handling time.", TIME_BUCKETS)
+db_seconds = Histogram('provics_request_db_seconds', "Time spent in SQL queries per request.", TIME_BUCKETS)
+query_count = Histogram('provics_request_queries', "SQL queries per request.", QUERY_BUCKETS)
+render_seconds = Histogram('provics_request_render_seconds', "Template render time per request.", TIME_BUCKETS)
+smtp_seconds = Histogram('provics_smtp_seconds', "Time per SMTP operation.", TIME_BUCKETS, label='operation')
+HISTOGRAMS = [request_seconds, db_seconds, query_count, render_seconds, smtp_seconds]
+
+
+def _current():
+    # Timings of the instrumented request being handled, or None
+    if has_request_context():
+        return g.get('_metrics')
+    return None
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current() is not None:
+        context._metrics_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, '_metrics_start', None)
+    timings = _current()
+    if start is not None and timings is not None:
+        timings['db'] += time.perf_counter() - start
+        timings['queries'] += 1
+
+def _before_render(sender, template, context, **extra):
+    timings = _current()
+    if timings is not None:
+        timings['_render_start'].append(time.perf_counter())
+
+def _after_render(sender, template, context, **extra):
+    timings = _current()
+    if timings is not None and timings['_render_start']:
+        timings['render'] += time.perf_counter() - timings['_render_start'].pop()
+
+@contextmanager
+def timed_smtp(operation='send'):
+    """Times an SMTP operation, adding it to the current request's timings if there is one."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        smtp_seconds.observe(operation, elapsed)
+        timings = _current()
+        if timings is not None:
+            timings['smtp'] += elapsed
+
+
+def init_metrics(app):
+    """
+    Installs the hooks. They stay idle, apart from a flag check, unless
+    app.config['METRICS_ENABLED'] is set when a request starts.
+    """
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+
+    @app.before_request
+    def start_timing():
+        if app.config['METRICS_ENABLED']:
+            g._metrics = {'start': time.perf_counter(), 'db': 0.0, 'queries': 0, 'render': 0.0, 'smtp': 0.0,
+                          '_render_start': []}
+
+    @app.after_request
+    def record_timing(response):
+        timings = _current()
+        if timings is None:
+            return response
+        total = time.perf_counter() - timings['start']
+        response.headers['Server-Timing'] = ', '.join([
+            f'db;dur={timings["db"] * 1000:.2f};desc="{timings["queries"]} queries"',
+            f'render;dur={timings["render"] * 1000:.2f}',
+            f'smtp;dur={timings["smtp"] * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+        endpoint = request.endpoint or 'unmatched'
+        request_seconds.observe(endpoint, total)
+        db_seconds.observe(endpoint, timings['db'])
+        query_count.observe(endpoint, timings['queries'])
+        render_seconds.observe(endpoint, timings['render'])
+        return response
+
+def render_prometheus():
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    return '\n'.join(lines) + '\n'
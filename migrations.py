@@ -0,0 +1,244 @@
+"""
+Versioned schema migrations.
+
+Each migration runs once, in order, in its own transaction; applied versions
+are recorded in the schema_version table. New schema changes go at the end
+of MIGRATIONS as a new version, never by editing an applied one.
+
+    python migrations.py            # upgrade to the latest version
+    python migrations.py --status   # show applied and pending versions
+"""
+import argparse
+import os
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, insert, select, text
+from models import db, DataVersion
+from search_utils import init_search
+from ai_utils import rebuild_keyword_index
+
+# Kept out of db.metadata so db.create_all()/drop_all() never touch it
+schema_version = Table(
+    'schema_version', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('description', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+# The schema as it stood when migrations were introduced, frozen: later model changes
+# must arrive through their own migrations, not through this one
+BASELINE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS "user" (
+        id {serial} NOT NULL,
+        email VARCHAR(120) NOT NULL,
+        password_hash VARCHAR(128),
+        name VARCHAR(100) NOT NULL,
+        role VARCHAR(20) NOT NULL,
+        bio TEXT,
+        skills VARCHAR(500),
+        resume_link VARCHAR(500),
+        PRIMARY KEY (id),
+        UNIQUE (email)
+    )""",
+    """CREATE TABLE IF NOT EXISTS email_outbox (
+        id {serial} NOT NULL,
+        to_email VARCHAR(120) NOT NULL,
+        subject VARCHAR(200) NOT NULL,
+        body TEXT NOT NULL,
+        status VARCHAR(20),
+        attempts INTEGER,
+        last_error TEXT,
+        next_attempt_at {timestamp},
+        created_at {timestamp},
+        sent_at {timestamp},
+        PRIMARY KEY (id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_email_outbox_status_next_attempt ON email_outbox (status, next_attempt_at)",
+    """CREATE TABLE IF NOT EXISTS industrial_visit (
+        id {serial} NOT NULL,
+        title VARCHAR(200) NOT NULL,
+        company_name VARCHAR(200) NOT NULL,
+        description TEXT NOT NULL,
+        date DATE NOT NULL,
+        location VARCHAR(200) NOT NULL,
+        visit_type VARCHAR(50),
+        provider_id INTEGER NOT NULL,
+        status VARCHAR(20),
+        PRIMARY KEY (id),
+        FOREIGN KEY (provider_id) REFERENCES "user" (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS mo_u (
+        id {serial} NOT NULL,
+        college_id INTEGER NOT NULL,
+        provider_id INTEGER NOT NULL,
+        status VARCHAR(20),
+        start_date DATE,
+        end_date DATE,
+        terms TEXT,
+        created_at {timestamp},
+        PRIMARY KEY (id),
+        FOREIGN KEY (college_id) REFERENCES "user" (id),
+        FOREIGN KEY (provider_id) REFERENCES "user" (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS notification (
+        id {serial} NOT NULL,
+        user_id INTEGER NOT NULL,
+        message VARCHAR(500) NOT NULL,
+        is_read BOOLEAN,
+        created_at {timestamp},
+        PRIMARY KEY (id),
+        FOREIGN KEY (user_id) REFERENCES "user" (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS notification_counter (
+        user_id INTEGER NOT NULL,
+        unread INTEGER NOT NULL,
+        PRIMARY KEY (user_id),
+        FOREIGN KEY (user_id) REFERENCES "user" (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS provider_stats (
+        provider_id INTEGER NOT NULL,
+        total_visits INTEGER NOT NULL,
+        total_applications INTEGER NOT NULL,
+        review_count INTEGER NOT NULL,
+        rating_sum INTEGER NOT NULL,
+        PRIMARY KEY (provider_id),
+        FOREIGN KEY (provider_id) REFERENCES "user" (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS application (
+        id {serial} NOT NULL,
+        student_id INTEGER NOT NULL,
+        visit_id INTEGER NOT NULL,
+        status VARCHAR(20),
+        applied_date {timestamp},
+        PRIMARY KEY (id),
+        FOREIGN KEY (student_id) REFERENCES "user" (id),
+        FOREIGN KEY (visit_id) REFERENCES industrial_visit (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS review (
+        id {serial} NOT NULL,
+        visit_id INTEGER NOT NULL,
+        student_id INTEGER NOT NULL,
+        rating INTEGER NOT NULL,
+        comment TEXT,
+        created_at {timestamp},
+        PRIMARY KEY (id),
+        FOREIGN KEY (visit_id) REFERENCES industrial_visit (id),
+        FOREIGN KEY (student_id) REFERENCES "user" (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS visit_keyword (
+        keyword TEXT NOT NULL,
+        visit_id INTEGER NOT NULL,
+        PRIMARY KEY (keyword, visit_id),
+        FOREIGN KEY (visit_id) REFERENCES industrial_visit (id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_visit_keyword_visit_id ON visit_keyword (visit_id)",
+]
+# Spellings that differ between the supported databases
+BASELINE_TYPES = {
+    'sqlite': {'serial': 'INTEGER', 'timestamp': 'DATETIME'},
+    'postgresql': {'serial': 'SERIAL', 'timestamp': 'TIMESTAMP WITHOUT TIME ZONE'},
+}
+
+def baseline(connection):
+    # Tables that don't exist yet; databases from before migrations already have most of them
+    types = BASELINE_TYPES.get(connection.dialect.name, BASELINE_TYPES['postgresql'])
+    for statement in BASELINE_SCHEMA:
+        connection.execute(text(statement.format(**types)))
+
+def hot_query_indexes(connection):
+    for statement in [
+        "CREATE INDEX IF NOT EXISTS ix_industrial_visit_status_visit_type ON industrial_visit (status, visit_type)",
+        "CREATE INDEX IF NOT EXISTS ix_industrial_visit_provider_id ON industrial_visit (provider_id)",
+        "CREATE INDEX IF NOT EXISTS ix_industrial_visit_status_date ON industrial_visit (status, date)",
+        "CREATE INDEX IF NOT EXISTS ix_application_visit_id ON application (visit_id)",
+        "CREATE INDEX IF NOT EXISTS ix_review_visit_id ON review (visit_id)",
+        "CREATE INDEX IF NOT EXISTS ix_notification_user_read_created ON notification (user_id, is_read, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_mou_college_status ON mo_u (college_id, status)",
+        "CREATE INDEX IF NOT EXISTS ix_mou_provider_status ON mo_u (provider_id, status)",
+        "CREATE INDEX IF NOT EXISTS ix_mou_status_end_date ON mo_u (status, end_date)",
+    ]:
+        connection.execute(text(statement))
+
+def unique_application(connection):
+    # Keep the first of any duplicate applications before enforcing uniqueness
+    connection.execute(text(
+        "DELETE FROM application WHERE id NOT IN "
+        "(SELECT MIN(id) FROM application GROUP BY student_id, visit_id)"))
+    connection.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_application_student_visit ON application (student_id, visit_id)"))
+
+def keyset_indexes(connection):
+    # Paginated listings filter on status (and type) and seek/order on id; (status, visit_type)
+    # is a prefix of the wider index, so it goes
+    connection.execute(text("DROP INDEX IF EXISTS ix_industrial_visit_status_visit_type"))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_industrial_visit_status_type_id ON industrial_visit (status, visit_type, id)"))
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_industrial_visit_status_id ON industrial_visit (status, id)"))
+
+def login_lookup(connection):
+    # Login matches emails case-insensitively; scrypt hashes don't fit the old 128 characters
+    connection.execute(text('CREATE INDEX IF NOT EXISTS ix_user_email_lower ON "user" (lower(email))'))
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text('ALTER TABLE "user" ALTER COLUMN password_hash TYPE VARCHAR(256)'))
+
+def data_versions(connection):
+    DataVersion.__table__.create(connection, checkfirst=True)
+
+def full_text_search(connection):
+    # FTS5 table + triggers on SQLite, tsvector column + GIN index on Postgres
+    init_search(connection)
+
+def keyword_index_backfill(connection):
+    # Databases with visits from before the recommendation keyword index
+    has_postings = connection.execute(text("SELECT 1 FROM visit_keyword LIMIT 1")).first()
+    if not has_postings:
+        rebuild_keyword_index(connection)
+
+MIGRATIONS = [
+    (1, "Baseline schema", baseline),
+    (2, "Full-text search index for visits", full_text_search),
+    (3, "Backfill recommendation keyword index", keyword_index_backfill),
+    (4, "Indexes for dashboard, notification and sweeper queries", hot_query_indexes),
+    (5, "Unique application per student and visit", unique_application),
+    (6, "Keyset pagination indexes for visit listings", keyset_indexes),
+    (7, "Case-insensitive email index and longer password hashes", login_lookup),
+    (8, "Data version counters for cached dashboard fragments", data_versions),
+]
+
+
+def current_version(connection):
+    schema_version.create(connection, checkfirst=True)
+    return connection.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+def upgrade(engine):
+    """Applies pending migrations. Returns the versions applied."""
+    with engine.begin() as connection:
+        current = current_version(connection)
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        with engine.begin() as connection:
+            migrate(connection)
+            connection.execute(insert(schema_version).values(
+                version=version, description=description, applied_at=datetime.utcnow()))
+        print(f"[MIGRATION] Applied {version}: {description}")
+        applied.append(version)
+    return applied
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Upgrade the Provics database schema.")
+    parser.add_argument('--status', action='store_true', help="list migrations without applying them")
+    args = parser.parse_args()
+
+    # Don't let the app's own startup migrate before --status can report
+    os.environ['AUTO_MIGRATE'] = 'False'
+    from app import app
+    with app.app_context():
+        if args.status:
+            with db.engine.begin() as connection:
+                current = current_version(connection)
+            for version, description, _ in MIGRATIONS:
+                print(f"{'applied' if version <= current else 'pending'}  {version}: {description}")
+        else:
+            upgrade(db.engine)
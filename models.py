@@ -1,14 +1,15 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
+from db_routing import RoutingSession
 
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
-   id = db.Column(db.Integer, primary_key=True)
+    id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128)) # Changed from password to password_hash
+    password_hash = db.Column(db.String(256)) # Changed from password to password_hash
     name = db.Column(db.String(100), nullable=False)
     role = db.Column(db.String(20), nullable=False) # student, college, provider, admin
     
@@ -21,6 +22,8 @@ class User(db.Model):
     visits_created = db.relationship('IndustrialVisit', backref='provider', lazy=True, cascade="all, delete-orphan")
     applications = db.relationship('Application', backref='student', lazy=True, cascade="all, delete-orphan")
     notifications = db.relationship('Notification', backref='user', lazy=True, cascade="all, delete-orphan")
+    notification_counter = db.relationship('NotificationCounter', uselist=False, lazy=True, cascade="all, delete-orphan")
+    provider_stats = db.relationship('ProviderStats', uselist=False, lazy=True, cascade="all, delete-orphan")
     
     # MoU Relationships
     mous_as_college = db.relationship('MoU', foreign_keys='MoU.college_id', backref='college', lazy=True, cascade="all, delete-orphan")
@@ -32,6 +35,9 @@ class User(db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+# Login looks emails up case-insensitively
+db.Index('ix_user_email_lower', db.func.lower(User.email))
+
 class Notification(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -39,6 +45,27 @@ class Notification(db.Model):
     is_read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (db.Index('ix_notification_user_read_created', 'user_id', 'is_read', 'created_at'),)
+
+class NotificationCounter(db.Model):
+    # Denormalized unread count per user, so the header doesn't COUNT(*) on every page
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    unread = db.Column(db.Integer, default=0, nullable=False)
+
+class ProviderStats(db.Model):
+    # Optional materialized dashboard stats per provider (PROVIDER_STATS_MATERIALIZED)
+    provider_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    total_visits = db.Column(db.Integer, default=0, nullable=False)
+    total_applications = db.Column(db.Integer, default=0, nullable=False)
+    review_count = db.Column(db.Integer, default=0, nullable=False)
+    rating_sum = db.Column(db.Integer, default=0, nullable=False)
+
+class DataVersion(db.Model):
+    # Change counter per data scope ('visits', 'student:<id>', ...), bumped in the
+    # writing transaction; cached dashboard fragments are keyed by it
+    scope = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+
 class Review(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     visit_id = db.Column(db.Integer, db.ForeignKey('industrial_visit.id'), nullable=False)
@@ -47,6 +74,8 @@ class Review(db.Model):
     comment = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (db.Index('ix_review_visit_id', 'visit_id'),)
+
 class MoU(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     college_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -57,6 +86,12 @@ class MoU(db.Model):
     terms = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_mou_status_end_date', 'status', 'end_date'),
+        db.Index('ix_mou_college_status', 'college_id', 'status'),
+        db.Index('ix_mou_provider_status', 'provider_id', 'status'),
+    )
+
 class IndustrialVisit(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -70,6 +105,19 @@ class IndustrialVisit(db.Model):
     
     applications = db.relationship('Application', backref='visit', lazy=True)
     reviews = db.relationship('Review', backref='visit', lazy=True)
+    keywords = db.relationship('VisitKeyword', backref='visit', lazy=True, cascade="all, delete-orphan")
+
+    __table_args__ = (
+        db.Index('ix_industrial_visit_status_date', 'status', 'date'),
+        db.Index('ix_industrial_visit_status_type_id', 'status', 'visit_type', 'id'),
+        db.Index('ix_industrial_visit_status_id', 'status', 'id'),
+        db.Index('ix_industrial_visit_provider_id', 'provider_id'),
+    )
+
+class VisitKeyword(db.Model):
+    # Inverted index for recommendations: one row per (keyword, visit) posting
+    keyword = db.Column(db.Text, primary_key=True)
+    visit_id = db.Column(db.Integer, db.ForeignKey('industrial_visit.id'), primary_key=True, index=True)
 
 class Application(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -77,3 +125,24 @@ class Application(db.Model):
     visit_id = db.Column(db.Integer, db.ForeignKey('industrial_visit.id'), nullable=False)
     status = db.Column(db.String(20), default='applied') # applied, accepted, rejected
     applied_date = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # One application per student and visit
+        db.Index('uq_application_student_visit', 'student_id', 'visit_id', unique=True),
+        db.Index('ix_application_visit_id', 'visit_id'),
+    )
+
+class EmailOutbox(db.Model):
+    # Emails queued by the web app and delivered by mail_worker.py
+    id = db.Column(db.Integer, primary_key=True)
+    to_email = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default='pending') # pending, sent, failed
+    attempts = db.Column(db.Integer, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (db.Index('ix_email_outbox_status_next_attempt', 'status', 'next_attempt_at'),)
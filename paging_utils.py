@@ -0,0 +1,43 @@
+from collections import namedtuple
+from flask import request
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# next_cursor/prev_cursor are None on the last/first page
+KeysetPage = namedtuple('KeysetPage', ['items', 'next_cursor', 'prev_cursor', 'per_page'])
+
+
+def keyset_paginate(query, column, after=None, before=None, per_page=DEFAULT_PAGE_SIZE):
+    """
+    Returns a KeysetPage of query ordered by column, which must be unique and
+    indexed (normally the primary key). after/before are cursors taken from a
+    neighbouring page: the column value of its last/first row.
+
+    Rows are found by seeking past the cursor in the index instead of with
+    OFFSET, so a deep page costs the same as the first one. One extra row is
+    fetched to tell whether another page follows.
+    """
+    key = column.key
+    if before is not None:
+        rows = query.filter(column < before).order_by(column.desc()).limit(per_page + 1).all()
+        items = rows[:per_page][::-1]
+        prev_cursor = getattr(items[0], key) if len(rows) > per_page else None
+        next_cursor = getattr(items[-1], key) if items else None
+    else:
+        if after is not None:
+            query = query.filter(column > after)
+        rows = query.order_by(column).limit(per_page + 1).all()
+        items = rows[:per_page]
+        next_cursor = getattr(items[-1], key) if len(rows) > per_page else None
+        prev_cursor = getattr(items[0], key) if after is not None and items else None
+    return KeysetPage(items, next_cursor, prev_cursor, per_page)
+
+def paginate_request(query, column):
+    """keyset_paginate with the cursor and page size taken from ?after=, ?before= and ?per_page="""
+    per_page = request.args.get('per_page', DEFAULT_PAGE_SIZE, type=int)
+    per_page = max(1, min(per_page, MAX_PAGE_SIZE))
+    return keyset_paginate(query, column,
+                           after=request.args.get('after', type=int),
+                           before=request.args.get('before', type=int),
+                           per_page=per_page)
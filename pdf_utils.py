@@ -0,0 +1,140 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from fpdf import FPDF
+
+
+def mou_fields(mou):
+    """The values printed on a MoU's PDF; equal fields render an identical document."""
+    return {
+        'college': mou.college.name,
+        'provider': mou.provider.name,
+        'start_date': str(mou.start_date),
+        'end_date': str(mou.end_date),
+        'terms': mou.terms or '',
+    }
+
+def render_mou_pdf(fields):
+    """Renders a MoU document from mou_fields() to PDF bytes."""
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+
+    pdf.set_font("Arial", 'B', 16)
+    pdf.cell(200, 10, txt="Memorandum of Understanding", ln=1, align='C')
+    pdf.ln(10)
+
+    pdf.set_font("Arial", size=12)
+    pdf.cell(200, 10, txt=f"This agreement is made between:", ln=1)
+    pdf.cell(200, 10, txt=f"College: {fields['college']}", ln=1)
+    pdf.cell(200, 10, txt=f"Provider: {fields['provider']}", ln=1)
+    pdf.ln(5)
+
+    pdf.cell(200, 10, txt=f"Valid From: {fields['start_date']} To: {fields['end_date']}", ln=1)
+    pdf.ln(5)
+
+    pdf.multi_cell(0, 10, txt=f"Terms of Agreement:\n{fields['terms']}")
+    pdf.ln(20)
+
+    pdf.cell(200, 10, txt="Signed Digitally via Provics Platform", ln=1, align='C')
+
+    return pdf.output(dest='S').encode('latin-1')
+
+
+class PDFCache:
+    """
+    Content-addressed cache of rendered PDFs on disk. Files are named after
+    the sha256 of the fields they were rendered from, so a changed MoU gets
+    a new file and stale ones simply age out. Reads bump the file's access
+    time; past max_bytes the least recently read files are deleted. The
+    modification time stays the render time, for Last-Modified.
+
+    Rather than scanning the directory on every write, each process adds what
+    it writes to the size found by its last scan, and scans (evicting down to
+    EVICT_TO of max_bytes) only once that passes max_bytes.
+    """
+    EVICT_TO = 0.9
+
+    def __init__(self, directory, max_bytes=100 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._bytes = None # Estimated directory size; None until the first scan
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(fields):
+        return hashlib.sha256(json.dumps(fields, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f'{key}.pdf')
+
+    def get(self, key):
+        """Returns the cached file's path, or None on a miss."""
+        path = self.path(key)
+        try:
+            stat = os.stat(path)
+            os.utime(path, (time.time(), stat.st_mtime))
+        except FileNotFoundError:
+            return None # Not rendered yet, or evicted by another worker
+        return path
+
+    def put(self, key, data):
+        """Stores PDF bytes under key and returns the file's path."""
+        os.makedirs(self.directory, exist_ok=True)
+        # Write then rename, so concurrent readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        path = self.path(key)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes += len(data)
+            due = self._bytes is None or self._bytes > self.max_bytes
+        if due:
+            self.evict()
+        return path
+
+    def open_or_render(self, fields):
+        """
+        Returns (key, binary file, modification time) for fields, rendering the
+        PDF on a miss. A file opened from the cache stays readable if it is
+        evicted meanwhile.
+        """
+        key = self.key(fields)
+        path = self.get(key)
+        if path is not None:
+            try:
+                f = open(path, 'rb')
+                return key, f, os.fstat(f.fileno()).st_mtime
+            except FileNotFoundError:
+                pass # Evicted since the lookup
+        data = render_mou_pdf(fields)
+        self.put(key, data)
+        return key, io.BytesIO(data), time.time()
+
+    def evict(self):
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.pdf'):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue # Evicted by another worker
+                    entries.append((stat.st_atime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            if total > self.max_bytes:
+                for _, size, path in sorted(entries):
+                    if total <= self.max_bytes * self.EVICT_TO:
+                        break
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    total -= size
+            self._bytes = total
@@ -1,6 +1,27 @@
+"""
+Seeds the database.
+
+    python populate_demo_data.py              # the demo accounts from the README
+    python populate_demo_data.py --scale 100  # plus synthetic data: 100k students, 10k visits, 1M applications...
+
+Synthetic rows go in with batched multi-row inserts in one transaction per
+run. Running it again adds another synthetic batch next to the first.
+"""
+import argparse
+import time
 from app import app, db, User, IndustrialVisit, Application, MoU, Review, Notification
+from models import NotificationCounter
+from ai_utils import index_visit, index_visit_ids
+from sqlalchemy import func, insert, select, text
 from werkzeug.security import generate_password_hash
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+
+# Synthetic rows per unit of --scale
+STUDENTS_PER_SCALE = 1000
+VISITS_PER_SCALE = 100
+APPLICATIONS_PER_SCALE = 10000
+NOTIFICATIONS_PER_SCALE = 10000
+BATCH_SIZE = 10000
 
 def populate():
     with app.app_context():
@@ -23,22 +44,25 @@ def populate():
             {"name": "Amit Patel", "email": "amit@test.com", "role": "student", "skills": "MBA, Marketing", "bio": "Business analyst"}
         ]
         
+        # One lookup for the accounts that already exist; everything is committed once at the end
+        existing = {user.email: user for user in User.query.filter(User.email.in_([u['email'] for u in users_data]))}
+        password_hash = generate_password_hash('pass123')
         users = {}
         for u in users_data:
-            user = User.query.filter_by(email=u['email']).first()
+            user = existing.get(u['email'])
             if not user:
                 user = User(
                     name=u['name'], 
                     email=u['email'], 
-                    password_hash=generate_password_hash('pass123'), 
+                    password_hash=password_hash, 
                     role=u['role'],
                     bio=u.get('bio', ''),
                     skills=u.get('skills', '')
                 )
                 db.session.add(user)
-                db.session.commit() # Commit to get ID
                 print(f"Created {u['role']}: {u['name']}")
             users[u['email']] = user
+        db.session.flush() # Assign IDs
 
         # --- 2. Create Visits ---
         visits_data = [
@@ -71,11 +95,13 @@ def populate():
             }
         ]
         
+        existing = {visit.title: visit for visit in
+                    IndustrialVisit.query.filter(IndustrialVisit.title.in_([v['title'] for v in visits_data]))}
         db_visits = []
         for v in visits_data:
             provider = users.get(v['provider'])
             if provider:
-                visit = IndustrialVisit.query.filter_by(title=v['title']).first()
+                visit = existing.get(v['title'])
                 if not visit:
                     visit = IndustrialVisit(
                         title=v['title'],
@@ -88,14 +114,15 @@ def populate():
                         status=v['status']
                     )
                     db.session.add(visit)
-                    db.session.commit()
+                    db.session.flush()
+                    index_visit(visit) # Recommendation keywords
                     print(f"Created Visit: {v['title']}")
                 db_visits.append(visit)
 
         # --- 3. Create Applications ---
         # Rahul applies to Zoho
         rahul = users.get('rahul@test.com')
-        zoho_visit = IndustrialVisit.query.filter_by(title="SaaS Product Development Internship").first()
+        zoho_visit = next((v for v in db_visits if v.title == "SaaS Product Development Internship"), None)
         
         if rahul and zoho_visit:
             if not Application.query.filter_by(student_id=rahul.id, visit_id=zoho_visit.id).first():
@@ -125,9 +152,132 @@ def populate():
         if rahul:
             n = Notification(user_id=rahul.id, message="Your application for Zoho Internship was accepted!", is_read=False)
             db.session.add(n)
+            # Keep the header's unread counter in step
+            counter = NotificationCounter.query.get(rahul.id)
+            if counter:
+                counter.unread += 1
 
         db.session.commit()
         print("Demo data populated successfully!")
 
+# --- BULK LOADER ---
+
+def insert_batched(connection, table, rows, batch_size=BATCH_SIZE):
+    """Inserts an iterable of row dicts as executemany batches. Returns the row count."""
+    count, batch = 0, []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            connection.execute(insert(table), batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        connection.execute(insert(table), batch)
+        count += len(batch)
+    return count
+
+def populate_bulk(connection, scale):
+    """
+    Loads a synthetic dataset sized by scale (see *_PER_SCALE; fractions are
+    fine) through connection, which the caller commits. Returns row counts.
+    """
+    students = max(1, int(STUDENTS_PER_SCALE * scale))
+    visits = max(1, int(VISITS_PER_SCALE * scale))
+    applications = int(APPLICATIONS_PER_SCALE * scale)
+    notifications = int(NOTIFICATIONS_PER_SCALE * scale)
+    colleges = max(1, students // 1000)
+    providers = max(1, visits // 20)
+
+    # Number this batch after earlier ones so emails stay unique
+    run = connection.execute(select(func.count()).select_from(User).where(User.email.like('admin%@scale.test'))).scalar()
+    first_user_id = (connection.execute(select(func.max(User.id))).scalar() or 0) + 1
+    first_visit_id = (connection.execute(select(func.max(IndustrialVisit.id))).scalar() or 0) + 1
+
+    def ids(model, *criteria):
+        return connection.execute(select(model.id).where(*criteria).order_by(model.id)).scalars().all()
+
+    # One hash for everyone; hashing per user would dominate the load
+    password_hash = generate_password_hash('pass123')
+    skills = ['Python, Flask, SQL', 'AutoCAD, Civil Engineering', 'Marketing, MBA', 'Embedded C, IoT']
+    user_rows = [{'email': f'admin{run}@scale.test', 'name': f'Admin {run}', 'role': 'admin',
+                  'password_hash': password_hash}]
+    user_rows += [{'email': f'college{i}.{run}@scale.test', 'name': f'College {i}', 'role': 'college',
+                   'password_hash': password_hash, 'bio': 'Synthetic college'} for i in range(colleges)]
+    user_rows += [{'email': f'provider{i}.{run}@scale.test', 'name': f'Provider {i}', 'role': 'provider',
+                   'password_hash': password_hash, 'bio': 'Synthetic provider'} for i in range(providers)]
+    user_rows += ({'email': f'student{i}.{run}@scale.test', 'name': f'Student {i}', 'role': 'student',
+                   'password_hash': password_hash, 'skills': skills[i % len(skills)]} for i in range(students))
+    counts = {'users': insert_batched(connection, User.__table__, user_rows)}
+    new_user = User.id >= first_user_id
+    college_ids = ids(User, new_user, User.role == 'college')
+    provider_ids = ids(User, new_user, User.role == 'provider')
+    student_ids = ids(User, new_user, User.role == 'student')
+
+    today = date.today()
+    topics = [('Python backend internship', 'Internship', 'Build Flask services and SQL reporting'),
+              ('Factory tour', 'Industrial Visit', 'Walk through the assembly line and quality lab'),
+              ('Site visit', 'Industrial Visit', 'Civil engineering site with AutoCAD planning office'),
+              ('Product mentorship', 'Mentorship', 'Marketing and product strategy with the MBA team')]
+    statuses = ['approved'] * 8 + ['pending', 'rejected']
+    counts['visits'] = insert_batched(connection, IndustrialVisit.__table__, (
+        {'title': f'{topics[i % 4][0]} #{i}', 'visit_type': topics[i % 4][1], 'description': topics[i % 4][2],
+         'company_name': f'Provider {i % providers}', 'provider_id': provider_ids[i % providers],
+         'location': 'Chennai', 'date': today + timedelta(days=i % 90), 'status': statuses[i % len(statuses)]}
+        for i in range(visits)))
+    visit_ids = ids(IndustrialVisit, IndustrialVisit.id >= first_visit_id)
+
+    # Student s's k-th application goes to visit (s + k) mod V, so pairs stay unique
+    applications = min(applications, len(student_ids) * len(visit_ids))
+    counts['applications'] = insert_batched(connection, Application.__table__, (
+        {'student_id': student_ids[i % len(student_ids)],
+         'visit_id': visit_ids[(i % len(student_ids) + i // len(student_ids)) % len(visit_ids)],
+         'status': 'applied'}
+        for i in range(applications)))
+    counts['reviews'] = insert_batched(connection, Review.__table__, (
+        {'student_id': student_ids[i % len(student_ids)], 'visit_id': visit_ids[(i * 7) % len(visit_ids)],
+         'rating': 1 + i % 5, 'comment': 'Useful visit'}
+        for i in range(applications // 10)))
+
+    # Every college partners with up to 20 providers; one in four MoUs is still pending
+    mou_rows = []
+    for c, college_id in enumerate(college_ids):
+        for k in range(min(20, len(provider_ids))):
+            signed = k % 4 != 3
+            mou_rows.append({'college_id': college_id, 'provider_id': provider_ids[(c + k) % len(provider_ids)],
+                             'status': 'active' if signed else 'pending', 'terms': 'Standard IV agreement',
+                             'start_date': today - timedelta(days=30) if signed else None,
+                             'end_date': today + timedelta(days=335) if signed else None})
+    counts['mous'] = insert_batched(connection, MoU.__table__, mou_rows)
+
+    user_ids = student_ids + provider_ids + college_ids
+    now = datetime.utcnow()
+    counts['notifications'] = insert_batched(connection, Notification.__table__, (
+        {'user_id': user_ids[i % len(user_ids)], 'message': f'Update #{i} on your account',
+         'is_read': i % 3 == 0, 'created_at': now - timedelta(minutes=i)}
+        for i in range(notifications)))
+    connection.execute(insert(NotificationCounter.__table__).from_select(
+        ['user_id', 'unread'],
+        select(Notification.user_id, func.count())
+        .where(Notification.user_id >= first_user_id, Notification.is_read == False)
+        .group_by(Notification.user_id)))
+
+    # The FTS triggers indexed the visits on insert; recommendations need the keyword postings
+    index_visit_ids(connection, visit_ids)
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text("ANALYZE"))
+    return counts
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Seed the Provics database.")
+    parser.add_argument('--scale', type=float, default=0,
+                        help=f"also load synthetic data: {STUDENTS_PER_SCALE} students, {VISITS_PER_SCALE} visits, "
+                             f"{APPLICATIONS_PER_SCALE} applications and {NOTIFICATIONS_PER_SCALE} notifications per unit")
+    args = parser.parse_args()
+
     populate()
+    if args.scale > 0:
+        with app.app_context():
+            started = time.perf_counter()
+            with db.engine.begin() as connection:
+                counts = populate_bulk(connection, args.scale)
+            print(f"[SUCCESS] Loaded {counts} in {time.perf_counter() - started:.1f}s")
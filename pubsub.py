@@ -0,0 +1,193 @@
+"""
+Publish/subscribe for pushing events (new notifications) to open
+Server-Sent Events streams.
+
+EVENT_BROKER=memory delivers within one process, which is enough for a
+single web worker. With several workers, or publishers in other processes
+(sweeper.py), use EVENT_BROKER=relay and run the relay on the same host:
+
+    python pubsub.py                # relay on 127.0.0.1:7070 (EVENT_RELAY_ADDRESS)
+
+Every process keeps one connection to the relay, which passes each
+published event on to all of them; each process then hands it to its own
+subscribers. Events are best effort: a subscriber that falls behind, or
+that is disconnected from the relay, misses them.
+"""
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from collections import defaultdict
+
+# Undelivered events kept per subscriber before newer ones are dropped
+SUBSCRIBER_QUEUE_SIZE = 100
+RECONNECT_SECONDS = 1
+
+
+class MemoryBroker:
+    """Delivers events to this process' subscribers."""
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel, limit=None):
+        """
+        Returns a queue that receives the channel's events until unsubscribed,
+        or None if this process already has limit subscribers.
+        """
+        subscription = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            if limit is not None and sum(len(s) for s in self._subscribers.values()) >= limit:
+                return None
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, channel, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, channel, message):
+        self._deliver(channel, message)
+
+    def _deliver(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.put_nowait(message)
+            except queue.Full:
+                pass # Stalled stream; it can catch up through the JSON API
+
+
+class RelayBroker(MemoryBroker):
+    """Shares events with the other processes connected to the relay at address."""
+
+    def __init__(self, address):
+        super().__init__()
+        self.address = address
+        self._sock = None
+        self._connected = threading.Event()
+        self._send_lock = threading.Lock()
+        self._started = False
+        self._down = False # Reported unavailable; logged once per outage
+
+    def _start(self):
+        with self._send_lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._run, daemon=True).start()
+        self._connected.wait(RECONNECT_SECONDS)
+
+    def _run(self):
+        # Keeps the relay connection up, delivering what it sends to local subscribers
+        while True:
+            try:
+                sock = socket.create_connection(self.address)
+            except OSError:
+                time.sleep(RECONNECT_SECONDS)
+                continue
+            with self._send_lock:
+                self._sock = sock
+                if self._down:
+                    self._down = False
+                    print(f"[SUCCESS] Event relay at {self.address} is back")
+            self._connected.set()
+            try:
+                for line in sock.makefile('r', encoding='utf-8'):
+                    channel, message = json.loads(line)
+                    self._deliver(channel, message)
+            except (OSError, ValueError):
+                pass
+            self._connected.clear()
+            with self._send_lock:
+                self._sock = None
+                self._report_down()
+            sock.close()
+            time.sleep(RECONNECT_SECONDS)
+
+    def _report_down(self):
+        # Caller holds _send_lock
+        if not self._down:
+            self._down = True
+            print(f"[FAILED] Event relay at {self.address} unavailable; delivering locally only until it is back")
+
+    def subscribe(self, channel, limit=None):
+        self._start()
+        return super().subscribe(channel, limit)
+
+    def publish(self, channel, message):
+        self._start()
+        line = (json.dumps([channel, message]) + '\n').encode('utf-8')
+        with self._send_lock:
+            if self._sock is not None:
+                try:
+                    self._sock.sendall(line)
+                    return # The relay sends it back to us too
+                except OSError:
+                    pass
+            self._report_down()
+        self._deliver(channel, message)
+
+
+def make_broker(backend, relay_address):
+    if backend == 'memory':
+        return MemoryBroker()
+    if backend == 'relay':
+        host, port = relay_address.rsplit(':', 1)
+        return RelayBroker((host, int(port)))
+    raise ValueError(f"Unknown EVENT_BROKER backend: {backend!r}")
+
+
+class RelayHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        with self.server.lock:
+            self.server.clients.add(self.wfile)
+        try:
+            for line in self.rfile:
+                with self.server.lock:
+                    for wfile in list(self.server.clients):
+                        try:
+                            wfile.write(line)
+                            wfile.flush()
+                        except OSError:
+                            self.server.clients.discard(wfile)
+        finally:
+            with self.server.lock:
+                self.server.clients.discard(self.wfile)
+
+class RelayServer(socketserver.ThreadingTCPServer):
+    """Passes every line a client sends on to all connected clients."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        super().__init__(address, RelayHandler)
+        self.clients = set()
+        self.lock = threading.Lock()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Relay Provics events between processes on this host.")
+    parser.add_argument('--address', default=os.environ.get('EVENT_RELAY_ADDRESS', '127.0.0.1:7070'),
+                        help="host:port to listen on")
+    args = parser.parse_args()
+
+    host, port = args.address.rsplit(':', 1)
+    with RelayServer((host, int(port))) as server:
+        print(f"[SUCCESS] Event relay listening on {args.address}")
+        server.serve_forever()
@@ -0,0 +1,132 @@
+import re
+from sqlalchemy import event, func, literal_column, text
+from sqlalchemy.exc import OperationalError
+from models import db, IndustrialVisit
+
+
+SQLITE_SETUP = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS visit_fts USING fts5(
+        title, description, company_name, content='industrial_visit', content_rowid='id')""",
+    """CREATE TRIGGER IF NOT EXISTS visit_fts_insert AFTER INSERT ON industrial_visit BEGIN
+        INSERT INTO visit_fts(rowid, title, description, company_name)
+        VALUES (new.id, new.title, new.description, new.company_name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS visit_fts_delete AFTER DELETE ON industrial_visit BEGIN
+        INSERT INTO visit_fts(visit_fts, rowid, title, description, company_name)
+        VALUES ('delete', old.id, old.title, old.description, old.company_name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS visit_fts_update AFTER UPDATE OF title, description, company_name
+    ON industrial_visit BEGIN
+        INSERT INTO visit_fts(visit_fts, rowid, title, description, company_name)
+        VALUES ('delete', old.id, old.title, old.description, old.company_name);
+        INSERT INTO visit_fts(rowid, title, description, company_name)
+        VALUES (new.id, new.title, new.description, new.company_name);
+    END""",
+]
+# Column weights for ranking: a hit in the title beats the company, which beats the description
+SQLITE_RANK = "bm25(visit_fts, 10.0, 1.0, 5.0)"
+
+POSTGRES_SETUP = [
+    """ALTER TABLE industrial_visit ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(company_name, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(description, '')), 'C')
+        ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_industrial_visit_search ON industrial_visit USING GIN (search_vector)",
+]
+
+# 'fts5', 'tsvector' or None (LIKE); detected on first search, set by init_search
+search_backend = None
+_detected = False
+
+
+def init_search(connection):
+    """
+    Creates the full-text index for the connection's database if missing.
+    SQLite gets an FTS5 table kept in sync by triggers; Postgres a generated
+    tsvector column with a GIN index. Other databases keep LIKE matching.
+    """
+    global search_backend, _detected
+    _detected = True
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        exists = connection.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'visit_fts'")).first()
+        try:
+            for statement in SQLITE_SETUP:
+                connection.execute(text(statement))
+        except OperationalError as e:
+            # SQLite built without FTS5
+            print(f"[WARNING] Full-text search unavailable: {str(e)}")
+            search_backend = None
+            return
+        if not exists:
+            # Index visits that existed before the FTS table
+            connection.execute(text("INSERT INTO visit_fts(visit_fts) VALUES ('rebuild')"))
+        search_backend = 'fts5'
+    elif dialect == 'postgresql':
+        for statement in POSTGRES_SETUP:
+            connection.execute(text(statement))
+        search_backend = 'tsvector'
+
+def drop_search(connection):
+    global search_backend
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text("DROP TABLE IF EXISTS visit_fts"))
+        search_backend = None
+
+def detect_search_backend():
+    global search_backend, _detected
+    if _detected:
+        return search_backend
+    with db.engine.connect() as connection:
+        dialect = connection.dialect.name
+        if dialect == 'sqlite':
+            found = connection.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'visit_fts'")).first()
+            search_backend = 'fts5' if found else None
+        elif dialect == 'postgresql':
+            found = connection.execute(text(
+                "SELECT 1 FROM information_schema.columns "
+                "WHERE table_name = 'industrial_visit' AND column_name = 'search_vector'")).first()
+            search_backend = 'tsvector' if found else None
+    _detected = True
+    return search_backend
+
+# Keep the index alongside the table when it is created or dropped through db.create_all()/drop_all()
+event.listen(IndustrialVisit.__table__, 'after_create', lambda target, connection, **kw: init_search(connection))
+event.listen(IndustrialVisit.__table__, 'before_drop', lambda target, connection, **kw: drop_search(connection))
+
+def _fts5_query(query_text):
+    # Quote each word so user input can't break FTS5 query syntax; words are ANDed
+    words = re.findall(r'\w+', query_text)
+    return ' '.join(f'"{w}"' for w in words)
+
+def search_visits(query_text, page=1, per_page=20, visit_type=None):
+    """
+    Returns a Pagination of approved visits matching query_text, most relevant first.
+    """
+    query = IndustrialVisit.query.filter_by(status='approved')
+    if visit_type:
+        query = query.filter_by(visit_type=visit_type)
+
+    backend = detect_search_backend()
+    if backend == 'fts5':
+        match = _fts5_query(query_text)
+        if not match:
+            query = query.filter(db.false())
+        else:
+            hits = (text(f"SELECT rowid AS visit_id, {SQLITE_RANK} AS rank FROM visit_fts WHERE visit_fts MATCH :match")
+                    .bindparams(match=match)
+                    .columns(visit_id=db.Integer, rank=db.Float)
+                    .subquery('hits'))
+            # bm25() is lower for better matches
+            query = query.join(hits, hits.c.visit_id == IndustrialVisit.id).order_by(hits.c.rank, IndustrialVisit.id)
+    elif backend == 'tsvector':
+        vector = literal_column('industrial_visit.search_vector')
+        ts_query = func.websearch_to_tsquery('english', query_text)
+        query = (query.filter(vector.op('@@')(ts_query))
+                 .order_by(func.ts_rank(vector, ts_query).desc(), IndustrialVisit.id))
+    else:
+        query = query.filter(IndustrialVisit.title.contains(query_text) | IndustrialVisit.description.contains(query_text))
+
+    return query.paginate(page=page, per_page=per_page, error_out=False)
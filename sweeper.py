@@ -0,0 +1,73 @@
+"""
+Periodic housekeeping that used to run inside dashboard requests:
+expires MoUs past their end date and completes visits whose date has passed.
+
+    python sweeper.py               # sweep every hour, forever
+    python sweeper.py --once        # sweep once, then exit
+"""
+import argparse
+import time
+from datetime import datetime
+from app import app, db, notify_users
+from models import MoU, IndustrialVisit
+from version_utils import VISITS_SCOPE, bump_versions, user_scope
+
+# Keep IN lists well under database parameter limits
+CHUNK_SIZE = 500
+
+
+def expire_mous(today):
+    """Marks active MoUs ending before today as expired and notifies both parties."""
+    expired = (db.session.query(MoU.id, MoU.college_id, MoU.provider_id)
+               .filter(MoU.status == 'active', MoU.end_date < today)
+               .all())
+    for start in range(0, len(expired), CHUNK_SIZE):
+        chunk = expired[start:start + CHUNK_SIZE]
+        (MoU.query
+         .filter(MoU.id.in_([mou.id for mou in chunk]), MoU.status == 'active')
+         .update({'status': 'expired'}, synchronize_session=False))
+        bump_versions(*[user_scope('college', mou.college_id) for mou in chunk],
+                      *[user_scope('provider', mou.provider_id) for mou in chunk])
+        notifications = []
+        for mou in chunk:
+            notifications.append((mou.college_id, "Your MoU has expired."))
+            notifications.append((mou.provider_id, "MoU has expired."))
+        # Commits the status changes together with the notifications
+        notify_users(notifications, "MoU Expired")
+    return len(expired)
+
+def complete_past_visits(today):
+    """Marks approved visits dated before today as completed."""
+    completed = (IndustrialVisit.query
+                 .filter(IndustrialVisit.status == 'approved', IndustrialVisit.date < today)
+                 .update({'status': 'completed'}, synchronize_session=False))
+    if completed:
+        bump_versions(VISITS_SCOPE)
+    db.session.commit()
+    return completed
+
+def sweep():
+    today = datetime.now().date()
+    expired = expire_mous(today)
+    completed = complete_past_visits(today)
+    print(f"[SWEEP] {expired} MoUs expired, {completed} visits completed")
+    return expired, completed
+
+def run(interval=3600):
+    with app.app_context():
+        while True:
+            sweep()
+            db.session.remove()
+            time.sleep(interval)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Expire MoUs and complete past visits.")
+    parser.add_argument('--once', action='store_true', help="sweep once and exit")
+    parser.add_argument('--interval', type=float, default=3600, help="seconds between sweeps")
+    args = parser.parse_args()
+
+    if args.once:
+        with app.app_context():
+            sweep()
+    else:
+        run(args.interval)
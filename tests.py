@@ -1,13 +1,75 @@
 # Tests module imports
+import os
+import socket
+import tempfile
+import threading
+import time
+import zipfile
+from io import BytesIO
 import unittest
-from app import app, db, User
+from unittest import mock
+from contextlib import contextmanager
+from flask import session as flask_session
+from sqlalchemy import create_engine, event, insert, inspect, text
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    Controller = None
+from datetime import date, timedelta
+# The engine is built when app is imported, so the test database must be named first;
+# never the configured one, which the tests fill and drop
+os.environ['FORCE_DATABASE_URL'] = 'sqlite://'
+from app import app, db, mail, notify_users, notification_header_cache, get_provider_stats, mou_pdf_cache, User, IndustrialVisit
+from app import failed_logins_by_email, failed_logins_by_ip, static_manifest, recommendation_cache
+from models import EmailOutbox, Notification, NotificationCounter, MoU, Application, Review, ProviderStats, VisitKeyword
+from sweeper import sweep
+from migrations import upgrade, schema_version, MIGRATIONS
+from mail_worker import drain_outbox
+from search_utils import search_visits
+from paging_utils import keyset_paginate
+from auth_utils import hash_password
+from werkzeug.security import check_password_hash
+from db_routing import use_replica
+from version_utils import VISITS_SCOPE, bump_versions
+from build_static import build as build_static
+from benchmark import run_benchmark
+from populate_demo_data import populate, populate_bulk
+from pdf_utils import PDFCache
+from fragment_cache import FileFragmentCache
+from pubsub import RelayBroker, RelayServer
+from ai_utils import get_matrix_recommendations, get_recommendations, get_top_recommendations, index_visit, TermMatrix
+
+
+@contextmanager
+def count_queries():
+    """Collects the SQL statements executed inside the block"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+@contextmanager
+def assert_max_queries(test, limit):
+    """Fails the test if the block runs more than limit SQL statements (N+1 guard)"""
+    with count_queries() as statements:
+        yield statements
+    test.assertLessEqual(len(statements), limit,
+                         f"{len(statements)} queries, expected at most {limit}:\n" + "\n".join(statements))
 
 
 class IVPlannerTestCase(unittest.TestCase):
-  def setUp(self):
+    def setUp(self):
         """Set up test database and client"""
         app.config['TESTING'] = True
-        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
         self.client = app.test_client()
         with app.app_context():
             db.create_all()
@@ -17,12 +79,23 @@ class IVPlannerTestCase(unittest.TestCase):
         with app.app_context():
             db.session.remove()
             db.drop_all()
+            # The schema is gone, so the next startup must migrate from scratch
+            schema_version.drop(db.engine, checkfirst=True)
+        # Fragment keys reuse the ids and versions of the next test's fresh database
+        if app.jinja_env.fragment_cache is not None:
+            app.jinja_env.fragment_cache.clear()
+        recommendation_cache.clear()
 
     def test_index_loads(self):
         """Test if homepage loads correctly"""
         response = self.client.get('/')
         self.assertEqual(response.status_code, 200)
-        self.assertIn(b'IV Connector', response.data)
+        self.assertIn(b'Provics', response.data)
+
+    def test_suite_uses_scratch_database(self):
+        """Test the suite runs on an in-memory database, not the configured one"""
+        with app.app_context():
+            self.assertEqual(db.engine.url.render_as_string(), 'sqlite://')
 
     def test_register_user(self):
         """Test user registration"""
@@ -40,5 +113,846 @@ class IVPlannerTestCase(unittest.TestCase):
             self.assertIsNotNone(user)
             self.assertEqual(user.role, 'student')
 
+    def test_top_recommendations_match_full_scan(self):
+        """Test the keyword index returns the same top picks as scoring every visit"""
+        with app.app_context():
+            provider = User(email='p@test.com', name='Acme', role='provider')
+            student = User(email='s@test.com', name='Stu', role='student', skills='Python, Flask, Machine Learning')
+            db.session.add_all([provider, student])
+            db.session.flush()
+            specs = [
+                ('Python Internship', 'Backend work with Flask', 'approved'),
+                ('Machine Learning Lab', 'Hands on learning with python models', 'approved'),
+                ('Metro Site Visit', 'Civil construction tour', 'approved'),
+                ('Flask Workshop', 'Python web apps', 'pending'),
+            ]
+            for title, description, status in specs:
+                visit = IndustrialVisit(title=title, description=description, company_name='Acme',
+                                        date=date(2030, 1, 1), location='Chennai', provider_id=provider.id, status=status)
+                db.session.add(visit)
+                db.session.flush()
+                index_visit(visit)
+            db.session.commit()
+
+            approved = IndustrialVisit.query.filter_by(status='approved').all()
+            expected = [r for r in get_recommendations(student, approved) if r['score'] > 0][:3]
+            top = get_top_recommendations(student, k=3)
+            self.assertEqual([(r['visit'].id, r['score']) for r in top],
+                             [(r['visit'].id, r['score']) for r in expected])
+
+            excluded = get_top_recommendations(student, k=3, exclude_ids=[top[0]['visit'].id])
+            self.assertNotIn(top[0]['visit'].id, [r['visit'].id for r in excluded])
+
+    def test_term_matrix_batch_scores(self):
+        """Test batch matrix scoring matches per-visit overlap percentages"""
+        with app.app_context():
+            provider = User(email='p@test.com', name='Acme', role='provider')
+            students = [User(email=f's{i}@test.com', name='Stu', role='student', skills=skills)
+                        for i, skills in enumerate(['Python, Flask', 'Civil construction, AutoCAD', 'Cooking'])]
+            db.session.add_all([provider] + students)
+            db.session.flush()
+            for title, description in [('Python Internship', 'Backend work with Flask and SQL'),
+                                        ('Metro Site Visit', 'Civil construction tour of the metro line'),
+                                        ('Flask Workshop', 'Seven python web apps in seven days')]:
+                db.session.add(IndustrialVisit(title=title, description=description, company_name='Acme',
+                                               date=date(2030, 1, 1), location='Chennai',
+                                               provider_id=provider.id, status='approved'))
+            db.session.commit()
+
+            matrix = TermMatrix()
+            approved = IndustrialVisit.query.filter_by(status='approved').all()
+            results = matrix.top_k(students, k=3)
+            for student, top in zip(students, results):
+                expected = [(r['visit'].id, r['score']) for r in get_recommendations(student, approved) if r['score'] > 0]
+                self.assertEqual(top, expected[:3])
+
+            # Rejecting a visit drops its row without rebuilding the others
+            approved[0].status = 'rejected'
+            matrix.upsert(approved[0])
+            self.assertNotIn(approved[0].id, [vid for vid, _ in matrix.top_k(students[:1])[0]])
+
+            # A visit completed elsewhere keeps its row, but is skipped and the list refilled
+            approved[0].status = 'approved'
+            matrix.upsert(approved[0])
+            (best_id, _), = matrix.top_k(students[:1], k=1)[0]
+            db.session.get(IndustrialVisit, best_id).status = 'completed'
+            db.session.commit()
+            with mock.patch('ai_utils.term_matrix', matrix):
+                top = get_matrix_recommendations(students[0], k=1)
+            self.assertEqual(len(top), 1)
+            self.assertNotEqual(top[0]['visit'].id, best_id)
+
+            # Changes another process made show up once it bumps the visits version
+            other = IndustrialVisit(title='Flask Bootcamp', description='Python and Flask', company_name='Acme',
+                                    date=date(2030, 1, 1), location='Chennai', provider_id=provider.id,
+                                    status='approved')
+            db.session.add(other)
+            db.session.get(IndustrialVisit, approved[0].id).status = 'completed'
+            bump_versions(VISITS_SCOPE)
+            db.session.commit()
+            ranked = [vid for vid, _ in matrix.top_k(students[:1], k=5)[0]]
+            self.assertIn(other.id, ranked)
+            self.assertNotIn(approved[0].id, ranked)
+
+    def test_search_visits_ranked(self):
+        """Test full-text search ranks title matches first and tracks status and deletes"""
+        with app.app_context():
+            provider = User(email='p@test.com', name='Acme', role='provider')
+            db.session.add(provider)
+            db.session.flush()
+            visits = {}
+            for title, description, status in [('Factory Tour', 'See the robotics assembly line', 'approved'),
+                                               ('Robotics Internship', 'Build robots', 'approved'),
+                                               ('Robotics Bootcamp', 'Not yet approved', 'pending')]:
+                visits[title] = IndustrialVisit(title=title, description=description, company_name='Acme',
+                                                date=date(2030, 1, 1), location='Chennai',
+                                                provider_id=provider.id, status=status)
+                db.session.add(visits[title])
+            db.session.commit()
+
+            results = search_visits('robotics')
+            self.assertEqual([v.title for v in results.items], ['Robotics Internship', 'Factory Tour'])
+            self.assertEqual(search_visits('robotics', per_page=1, page=2).items[0].title, 'Factory Tour')
+
+            db.session.delete(visits['Factory Tour'])
+            db.session.commit()
+            self.assertEqual(search_visits('robotics').total, 1)
+            self.assertEqual(search_visits('"robot-ics (').total, 0)
+
+    @unittest.skipUnless(Controller, "aiosmtpd not installed")
+    def test_outbox_worker_delivers_and_retries(self):
+        """Test queued emails are delivered by the worker over SMTP, with retries on failure"""
+        class Handler:
+            def __init__(self):
+                self.received = []
+
+            async def handle_DATA(self, server, session, envelope):
+                self.received.append(envelope.rcpt_tos[0])
+                return '250 OK'
+
+        handler = Handler()
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        controller = Controller(handler, hostname='127.0.0.1', port=port)
+        controller.start()
+        saved = {k: app.config[k] for k in ('MAIL_SERVER', 'MAIL_PORT', 'MAIL_USE_TLS', 'MAIL_USERNAME',
+                                            'MAIL_PASSWORD', 'MAIL_DEFAULT_SENDER')}
+        saved['MAIL_SUPPRESS_SEND'] = app.config.get('MAIL_SUPPRESS_SEND', app.testing)
+        try:
+            app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=port,
+                              MAIL_USE_TLS=False, MAIL_USERNAME=None, MAIL_PASSWORD=None,
+                              MAIL_DEFAULT_SENDER='noreply@test.com', MAIL_SUPPRESS_SEND=False)
+            mail.init_app(app)
+            with app.app_context():
+                db.session.add_all([EmailOutbox(to_email='a@test.com', subject='Hi', body='One'),
+                                    EmailOutbox(to_email='b@test.com', subject='Hi', body='Two')])
+                db.session.commit()
+                self.assertEqual(drain_outbox(), 2)
+                self.assertEqual(sorted(handler.received), ['a@test.com', 'b@test.com'])
+                self.assertEqual(EmailOutbox.query.filter_by(status='sent').count(), 2)
+
+                # Unreachable server: the email stays queued with a backoff
+                app.config['MAIL_PORT'] = 1
+                mail.init_app(app)
+                db.session.add(EmailOutbox(to_email='c@test.com', subject='Hi', body='Three'))
+                db.session.commit()
+                self.assertEqual(drain_outbox(), 0)
+                email = EmailOutbox.query.filter_by(to_email='c@test.com').one()
+                self.assertEqual((email.status, email.attempts), ('pending', 1))
+                self.assertGreater(email.next_attempt_at, email.created_at)
+        finally:
+            controller.stop()
+            app.config.update(saved)
+            mail.init_app(app)
+
+    def test_notify_users_in_bulk(self):
+        """Test bulk notifications insert every row and queue one email per known recipient"""
+        with app.app_context():
+            users = [User(email=f'u{i}@test.com', name=f'User {i}', role='student') for i in range(3)]
+            db.session.add_all(users)
+            db.session.commit()
+            pairs = [(u.id, f'Hello {u.name}') for u in users] + [(users[0].id, 'Second message')]
+            notify_users(pairs, "Broadcast")
+
+            self.assertEqual(Notification.query.count(), 4)
+            self.assertEqual(Notification.query.filter_by(user_id=users[0].id).count(), 2)
+            emails = EmailOutbox.query.order_by(EmailOutbox.id).all()
+            self.assertEqual([(e.to_email, e.subject) for e in emails],
+                             [('u0@test.com', 'Broadcast'), ('u1@test.com', 'Broadcast'),
+                              ('u2@test.com', 'Broadcast'), ('u0@test.com', 'Broadcast')])
+
+    def test_sweeper_expires_mous_and_completes_visits(self):
+        """Test the sweeper expires old MoUs and completes past visits in bulk"""
+        with app.app_context():
+            college = User(email='c@test.com', name='College', role='college')
+            provider = User(email='p@test.com', name='Acme', role='provider')
+            db.session.add_all([college, provider])
+            db.session.flush()
+            today = date.today()
+            db.session.add_all([
+                MoU(college_id=college.id, provider_id=provider.id, status='active',
+                    start_date=today - timedelta(days=30), end_date=today - timedelta(days=1)),
+                MoU(college_id=college.id, provider_id=provider.id, status='active',
+                    start_date=today, end_date=today + timedelta(days=30)),
+                IndustrialVisit(title='Past', description='Done', company_name='Acme', date=today - timedelta(days=1),
+                                location='Chennai', provider_id=provider.id, status='approved'),
+                IndustrialVisit(title='Future', description='Soon', company_name='Acme', date=today + timedelta(days=1),
+                                location='Chennai', provider_id=provider.id, status='approved'),
+            ])
+            db.session.commit()
+
+            self.assertEqual(sweep(), (1, 1))
+            self.assertEqual(sorted(m.status for m in MoU.query.all()), ['active', 'expired'])
+            self.assertEqual(IndustrialVisit.query.filter_by(title='Past').one().status, 'completed')
+            self.assertEqual(Notification.query.count(), 2)
+            self.assertEqual(sweep(), (0, 0))
+
+    def test_notification_header_cached(self):
+        """Test the header counter is cached, and invalidated by new and read notifications"""
+        with app.app_context():
+            user = User(email='u@test.com', name='User', role='student')
+            db.session.add(user)
+            db.session.commit()
+            user_id = user.id
+            notify_users([(user_id, 'First')])
+        notification_header_cache.clear()
+        with self.client.session_transaction() as sess:
+            sess.update(user_id=user_id, role='student', name='User')
+
+        self.client.get('/')
+        with count_queries() as statements:
+            response = self.client.get('/')
+        self.assertEqual(statements, [])
+        self.assertIn(b'First', response.data)
+
+        with app.app_context():
+            notify_users([(user_id, 'Second'), (user_id, 'Third')])
+        response = self.client.get('/')
+        self.assertIn(b'Third', response.data)
+        with app.app_context():
+            self.assertEqual(db.session.get(NotificationCounter, user_id).unread, 3)
+
+        self.client.get('/notifications/mark_read', headers={'Referer': '/'})
+        with app.app_context():
+            self.assertEqual(db.session.get(NotificationCounter, user_id).unread, 0)
+
+    def test_notify_users_creates_missing_counter(self):
+        """Test notify_users creates a missing counter from the unread count before adding to it"""
+        with app.app_context():
+            user = User(email='u@test.com', name='User', role='student')
+            db.session.add(user)
+            db.session.commit()
+            db.session.add_all([Notification(user_id=user.id, message='Old'),
+                                Notification(user_id=user.id, message='Read', is_read=True)])
+            db.session.commit()
+            notify_users([(user.id, 'New')])
+            self.assertEqual(db.session.get(NotificationCounter, user.id).unread, 2)
+
+    def test_provider_stats_aggregates_and_materialized(self):
+        """Test provider stats come from aggregates and stay in sync when materialized"""
+        with app.app_context():
+            provider = User(email='p@test.com', name='Acme', role='provider')
+            student = User(email='s@test.com', name='Stu', role='student')
+            db.session.add_all([provider, student])
+            db.session.flush()
+            visit = IndustrialVisit(title='Tour', description='Plant tour', company_name='Acme', date=date(2030, 1, 1),
+                                    location='Chennai', provider_id=provider.id, status='approved')
+            db.session.add(visit)
+            db.session.flush()
+            db.session.add_all([Application(student_id=student.id, visit_id=visit.id),
+                                Review(visit_id=visit.id, student_id=student.id, rating=4),
+                                Review(visit_id=visit.id, student_id=student.id, rating=5)])
+            db.session.commit()
+            ids = dict(provider=provider.id, student=student.id, visit=visit.id)
+
+            stats = get_provider_stats(ids['provider'])
+            self.assertEqual((stats.total_visits, stats.total_applications, stats.review_count, stats.rating_sum),
+                             (1, 1, 2, 9))
+
+        app.config['PROVIDER_STATS_MATERIALIZED'] = True
+        try:
+            with app.app_context():
+                get_provider_stats(ids['provider'])
+                self.assertIsNotNone(db.session.get(ProviderStats, ids['provider']))
+            with self.client.session_transaction() as sess:
+                sess.update(user_id=ids['student'], role='student', name='Stu')
+            self.client.post(f"/visit/review/{ids['visit']}", data={'rating': '1', 'comment': 'Meh'})
+            with app.app_context():
+                stats = get_provider_stats(ids['provider'])
+                self.assertEqual((stats.review_count, stats.rating_sum), (3, 10))
+        finally:
+            app.config['PROVIDER_STATS_MATERIALIZED'] = False
+
+    def test_migrations_build_schema_once(self):
+        """Test migrations create the schema and indexes on an empty database, then are a no-op"""
+        engine = create_engine('sqlite://')
+        self.assertEqual(upgrade(engine), [version for version, _, _ in MIGRATIONS])
+        self.assertEqual(upgrade(engine), [])
+        # The frozen baseline plus later migrations end up with what the models declare
+        inspector = inspect(engine)
+        with engine.connect() as connection: # Reflection skips expression indexes
+            index_names = set(connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars())
+        for table in db.metadata.sorted_tables:
+            self.assertEqual({c['name'] for c in inspector.get_columns(table.name)}, set(table.columns.keys()))
+            self.assertLessEqual({index.name for index in table.indexes}, index_names, table.name)
+        engine.dispose()
+
+    def test_dashboards_query_count_is_flat(self):
+        """Test dashboards don't issue a query per application or MoU"""
+        with app.app_context():
+            college = User(email='c@test.com', name='College', role='college')
+            provider = User(email='p@test.com', name='Acme', role='provider')
+            student = User(email='s@test.com', name='Stu', role='student', skills='Python')
+            db.session.add_all([college, provider, student])
+            db.session.flush()
+            for i in range(10):
+                visit = IndustrialVisit(title=f'Visit {i}', description='Python tour', company_name='Acme',
+                                        date=date(2030, 1, 1), location='Chennai', provider_id=provider.id,
+                                        status='approved')
+                db.session.add(visit)
+                db.session.flush()
+                db.session.add(Application(student_id=student.id, visit_id=visit.id))
+                db.session.add(MoU(college_id=college.id, provider_id=provider.id, terms=f'Terms {i}'))
+            db.session.commit()
+            ids = dict(college=college.id, student=student.id, mou=MoU.query.first().id)
+
+        # Cold fragment cache: every panel renders, plus one query for the panels' version stamp
+        for role, url, limit in [('student', '/student/dashboard', 9), ('college', '/college/dashboard', 11),
+                                 ('college', f"/mou/download/{ids['mou']}", 2)]:
+            with self.client.session_transaction() as sess:
+                sess.update(user_id=ids[role], role=role, name=role)
+            notification_header_cache.clear()
+            with assert_max_queries(self, limit):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_keyset_pagination_walks_both_ways(self):
+        """Test keyset pages cover every row once and the admin list follows cursors"""
+        with app.app_context():
+            db.session.add_all([User(email=f'u{i}@test.com', name=f'User {i}', role='student') for i in range(7)])
+            db.session.commit()
+            ids = [u.id for u in User.query.order_by(User.id)]
+
+            seen, page = [], keyset_paginate(User.query, User.id, per_page=3)
+            while True:
+                seen.extend(u.id for u in page.items)
+                if page.next_cursor is None:
+                    break
+                page = keyset_paginate(User.query, User.id, after=page.next_cursor, per_page=3)
+            self.assertEqual(seen, ids)
+
+            # Walking back from the last page lands on the page before it
+            back = keyset_paginate(User.query, User.id, before=page.prev_cursor, per_page=3)
+            self.assertEqual([u.id for u in back.items], ids[3:6])
+            self.assertEqual(back.next_cursor, ids[5])
+            self.assertEqual(back.prev_cursor, ids[3])
+
+        with self.client.session_transaction() as sess:
+            sess.update(user_id=ids[0], role='admin', name='Admin')
+        response = self.client.get(f'/admin/dashboard?per_page=2&after={ids[1]}')
+        self.assertIn(b'u2@test.com', response.data)
+        self.assertNotIn(b'u1@test.com', response.data)
+        self.assertNotIn(b'u4@test.com', response.data)
+        self.assertIn(f'after={ids[3]}'.encode(), response.data)
+
+    def test_mou_pdf_cached_and_conditional(self):
+        """Test MoU PDFs are rendered once, revalidate with 304 and are evicted least recently read first"""
+        with app.app_context():
+            college = User(email='c@test.com', name='College', role='college')
+            provider = User(email='p@test.com', name='Acme', role='provider')
+            db.session.add_all([college, provider])
+            db.session.flush()
+            mou = MoU(college_id=college.id, provider_id=provider.id, status='active', terms='Two visits a year',
+                      start_date=date(2030, 1, 1), end_date=date(2031, 1, 1))
+            db.session.add(mou)
+            db.session.commit()
+            college_id, mou_id = college.id, mou.id
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            self.addCleanup(setattr, mou_pdf_cache, 'directory', mou_pdf_cache.directory)
+            mou_pdf_cache.directory = cache_dir
+            with self.client.session_transaction() as sess:
+                sess.update(user_id=college_id, role='college', name='College')
+            first = self.client.get(f'/mou/download/{mou_id}')
+            self.assertEqual(first.status_code, 200)
+            self.assertTrue(first.data.startswith(b'%PDF'))
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+            repeat = self.client.get(f'/mou/download/{mou_id}', headers={'If-None-Match': first.headers['ETag']})
+            self.assertEqual(repeat.status_code, 304)
+            repeat = self.client.get(f'/mou/download/{mou_id}',
+                                     headers={'If-Modified-Since': first.headers['Last-Modified']})
+            self.assertEqual(repeat.status_code, 304)
+
+            # Evicted between the lookup and the read: rendered again instead of a 500
+            with mock.patch.object(mou_pdf_cache, 'get', return_value=os.path.join(cache_dir, 'gone.pdf')):
+                raced = self.client.get(f'/mou/download/{mou_id}')
+            self.assertEqual(raced.status_code, 200)
+            self.assertTrue(raced.data.startswith(b'%PDF'))
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = PDFCache(cache_dir, max_bytes=250)
+            for age, name in enumerate(['a', 'b']):
+                cache.put(name, b'x' * 100)
+                os.utime(cache.path(name), (age, age))
+            cache.get('a')
+            with mock.patch.object(cache, 'evict', wraps=cache.evict) as evict:
+                cache.put('c', b'x' * 100)
+            self.assertEqual(sorted(os.listdir(cache_dir)), ['a.pdf', 'c.pdf'])
+            self.assertEqual(evict.call_count, 1)
+            # Under the size limit, writes don't scan the directory
+            with mock.patch.object(cache, 'evict') as evict:
+                cache.put('d', b'x' * 10)
+            evict.assert_not_called()
+
+    def test_mou_export_streams_zip(self):
+        """Test the MoU export streams a ZIP of the signed MoUs and fills the PDF cache"""
+        with app.app_context():
+            college = User(email='c@test.com', name='College', role='college')
+            provider = User(email='p@test.com', name='Acme', role='provider')
+            db.session.add_all([college, provider])
+            db.session.flush()
+            signed = [MoU(college_id=college.id, provider_id=provider.id, status='active', terms=f'Terms {i}',
+                          start_date=date(2030, 1, 1), end_date=date(2031, 1, 1)) for i in range(3)]
+            db.session.add_all(signed + [MoU(college_id=college.id, provider_id=provider.id, terms='Pending')])
+            db.session.commit()
+            college_id, signed_ids = college.id, [mou.id for mou in signed]
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            self.addCleanup(setattr, mou_pdf_cache, 'directory', mou_pdf_cache.directory)
+            mou_pdf_cache.directory = cache_dir
+            with self.client.session_transaction() as sess:
+                sess.update(user_id=college_id, role='college', name='College')
+            response = self.client.get('/mou/export')
+            self.assertTrue(response.is_streamed)
+            self.assertEqual(response.mimetype, 'application/zip')
+
+            archive = zipfile.ZipFile(BytesIO(response.data))
+            self.assertEqual(archive.namelist(), [f'MoU_{i}.pdf' for i in signed_ids])
+            for name in archive.namelist():
+                self.assertTrue(archive.read(name).startswith(b'%PDF'))
+            self.assertEqual(len(os.listdir(cache_dir)), 3)
+
+    def test_metrics_server_timing_and_endpoint(self):
+        """Test instrumented requests get a Server-Timing header and show up on the admin metrics endpoint"""
+        with app.app_context():
+            admin = User(email='a@test.com', name='Admin', role='admin')
+            db.session.add(admin)
+            db.session.commit()
+            admin_id = admin.id
+        with self.client.session_transaction() as sess:
+            sess.update(user_id=admin_id, role='admin', name='Admin')
+
+        self.assertNotIn('Server-Timing', self.client.get('/admin/dashboard').headers)
+        self.assertEqual(self.client.get('/admin/metrics').status_code, 404)
+
+        app.config['METRICS_ENABLED'] = True
+        self.addCleanup(app.config.update, METRICS_ENABLED=False)
+        timing = self.client.get('/admin/dashboard').headers['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+        self.assertIn('render;dur=', timing)
+
+        metrics = self.client.get('/admin/metrics').get_data(as_text=True)
+        self.assertIn('# TYPE provics_request_duration_seconds histogram', metrics)
+        self.assertRegex(metrics, r'provics_request_queries_count\{endpoint="admin_dashboard"\} [1-9]')
+
+        with self.client.session_transaction() as sess:
+            sess.update(role='student')
+        self.assertEqual(self.client.get('/admin/metrics').status_code, 302)
+
+    def test_benchmark_reports_every_route(self):
+        """Test the benchmark seeds a dataset and reports latency and query counts for each hot route"""
+        with app.app_context():
+            with db.engine.begin() as connection:
+                dataset = populate_bulk(connection, scale=0.1)
+        self.assertEqual((dataset['users'], dataset['visits'], dataset['applications']), (103, 10, 1000))
+
+        results = run_benchmark(app, requests_per_route=3)
+        self.assertEqual(set(results), {'student_dashboard', 'provider_dashboard', 'college_dashboard',
+                                        'admin_dashboard', 'download_mou', 'apply_visit'})
+        for name, stats in results.items():
+            self.assertLessEqual(stats['p50_ms'], stats['p95_ms'])
+            self.assertGreater(stats['queries_p50'], 0)
+            self.assertNotIn('500', stats['status_codes'], name)
+
+    def test_populate_demo_and_bulk_rerun(self):
+        """Test the demo seed is idempotent and repeated bulk loads add fresh synthetic users"""
+        populate()
+        populate()
+        with app.app_context():
+            self.assertEqual(User.query.filter(User.email.like('%@test.com')).count(), 8)
+            self.assertEqual(IndustrialVisit.query.count(), 3)
+            # Demo visits are in the recommendation keyword index
+            self.assertTrue(all(visit.keywords for visit in IndustrialVisit.query))
+
+            for _ in range(2):
+                with db.engine.begin() as connection:
+                    populate_bulk(connection, scale=0.1)
+            self.assertEqual(User.query.filter(User.email.like('admin%@scale.test')).count(), 2)
+            self.assertEqual(Application.query.count(), 2 * 1000 + 1)
+            # Both runs indexed their own visits, and each visit only once
+            self.assertTrue(all(visit.keywords for visit in IndustrialVisit.query))
+            self.assertEqual(VisitKeyword.query.count(),
+                             db.session.query(VisitKeyword.visit_id, VisitKeyword.keyword).distinct().count())
+
+    def test_login_rehashes_outdated_hash(self):
+        """Test login matches emails case-insensitively and upgrades hashes made with an old method"""
+        with app.app_context():
+            db.session.add(User(email='Anna@Test.com', name='Anna', role='college',
+                                password_hash=hash_password('pass123', 'pbkdf2:sha256:1000')))
+            db.session.commit()
+        self.addCleanup(app.config.update, PASSWORD_HASH_METHOD=app.config['PASSWORD_HASH_METHOD'])
+        app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+
+        response = self.client.post('/login', data=dict(email=' anna@test.com', password='pass123'))
+        self.assertEqual(response.status_code, 302)
+        with app.app_context():
+            self.assertTrue(User.query.first().password_hash.startswith('pbkdf2:sha256:2000$'))
+
+    def test_password_reset_matches_email_case_insensitively(self):
+        """Test a password reset finds the account however the email is capitalized"""
+        with app.app_context():
+            db.session.add(User(email='Anna@Test.com', name='Anna', role='college',
+                                password_hash=hash_password('pass123', 'pbkdf2:sha256:1000')))
+            db.session.commit()
+
+        response = self.client.post('/forgot_password', data=dict(email=' anna@test.com'))
+        self.assertEqual(response.status_code, 302)
+        with self.client.session_transaction() as sess:
+            sess['reset_verified'] = True
+        self.client.post('/reset_password/new', data=dict(password='newpass1', confirm_password='newpass1'))
+        with app.app_context():
+            self.assertTrue(check_password_hash(User.query.first().password_hash, 'newpass1'))
+
+    def test_login_burst_refused_before_hashing(self):
+        """Test repeated failed logins for an account are refused without checking the password"""
+        self.addCleanup(failed_logins_by_email.clear)
+        self.addCleanup(failed_logins_by_ip.clear)
+        with app.app_context():
+            db.session.add(User(email='anna@test.com', name='Anna', role='college',
+                                password_hash=hash_password('pass123', 'pbkdf2:sha256:1000')))
+            db.session.commit()
+
+        for _ in range(app.config['LOGIN_MAX_FAILURES']):
+            response = self.client.post('/login', data=dict(email='anna@test.com', password='wrong'))
+            self.assertEqual(response.status_code, 200)
+        with mock.patch('auth_utils.check_password_hash') as check:
+            response = self.client.post('/login', data=dict(email='anna@test.com', password='pass123'))
+        self.assertEqual(response.status_code, 429)
+        check.assert_not_called()
+
+    def test_login_throttle_counts_forwarded_client(self):
+        """Test the per-address login throttle counts the client behind the proxy, not the proxy"""
+        self.addCleanup(failed_logins_by_email.clear)
+        self.addCleanup(failed_logins_by_ip.clear)
+        with mock.patch.object(failed_logins_by_ip, 'max_failures', 1):
+            self.client.post('/login', data=dict(email='anna@test.com', password='wrong'),
+                             headers={'X-Forwarded-For': '203.0.113.7'})
+            self.assertTrue(failed_logins_by_ip.blocked('203.0.113.7'))
+            self.assertFalse(failed_logins_by_ip.blocked('127.0.0.1'))
+
+    def test_replica_reads_until_session_writes(self):
+        """Test read-only views read from the replica, and writers read their own writes from the primary"""
+        replica = create_engine('sqlite://')
+        with app.app_context():
+            admin = User(email='a@test.com', name='Admin', role='admin')
+            db.session.add(admin)
+            db.session.commit()
+            admin_id = admin.id
+            db.metadata.create_all(replica)
+            with replica.begin() as connection:
+                connection.execute(insert(User.__table__).values(id=admin_id, email='a@test.com',
+                                                                 name='Admin (replica)', role='admin'))
+            db.engines['replica'] = replica
+        self.addCleanup(replica.dispose)
+        self.addCleanup(db._app_engines[app].pop, 'replica')
+
+        with app.test_request_context():
+            self.assertEqual(User.query.get(admin_id).name, 'Admin')
+            db.session.expunge_all()
+            with use_replica():
+                self.assertEqual(User.query.get(admin_id).name, 'Admin (replica)')
+                db.session.add(Notification(user_id=admin_id, message='Hello'))
+                db.session.commit()
+                self.assertEqual(User.query.get(admin_id).name, 'Admin')
+                self.assertGreater(flask_session['_primary_until'], time.time())
+            db.session.remove()
+
+        with self.client.session_transaction() as sess:
+            sess.update(user_id=admin_id, role='admin', name='Admin')
+        notification_header_cache.clear()
+        self.assertIn(b'Admin (replica)', self.client.get('/admin/dashboard').data)
+        with self.client.session_transaction() as sess:
+            sess['_primary_until'] = time.time() + 60
+        self.assertNotIn(b'Admin (replica)', self.client.get('/admin/dashboard').data)
+
+    def test_static_build_hashes_and_compresses(self):
+        """Test the static build writes hashed, precompressed files and url_for points at them"""
+        with tempfile.TemporaryDirectory() as output_dir:
+            manifest = build_static(output_dir=output_dir)
+            hashed = manifest['css/style.css']
+            self.assertRegex(hashed, r'^css/style\.[0-9a-f]{12}\.css$')
+            self.assertTrue(os.path.exists(os.path.join(output_dir, hashed + '.gz')))
+            self.assertFalse(os.path.exists(os.path.join(output_dir, manifest['logo.png'] + '.gz')))
+            self.assertFalse(any(name.startswith('uploads/') for name in manifest))
+
+        with mock.patch.dict(static_manifest, {'css/style.css': hashed}):
+            self.assertIn(f'href="/static/{hashed}"'.encode(), self.client.get('/').data)
+
+    def test_dashboard_panels_cached_until_data_changes(self):
+        """Test cached panels skip their queries and are re-rendered after a write"""
+        with app.app_context():
+            college = User(email='c@test.com', name='College', role='college')
+            provider = User(email='p@test.com', name='Acme', role='provider')
+            student = User(email='s@test.com', name='Stu', role='student', skills='Python')
+            db.session.add_all([college, provider, student])
+            db.session.flush()
+            visit = IndustrialVisit(title='Robotics Tour', description='Python robots', company_name='Acme',
+                                    date=date(2030, 1, 1), location='Chennai', provider_id=provider.id)
+            db.session.add(visit)
+            db.session.flush()
+            index_visit(visit)
+            db.session.add(MoU(college_id=college.id, provider_id=provider.id, terms='Terms'))
+            db.session.commit()
+            ids = dict(college=college.id, provider=provider.id, student=student.id, visit=visit.id,
+                       mou=MoU.query.first().id)
+
+        def get(role, url):
+            with self.client.session_transaction() as sess:
+                sess.update(user_id=ids[role], role=role, name=role)
+            with count_queries() as statements:
+                response = self.client.get(url)
+            return response.data, statements
+
+        self.assertNotIn(b'% Match', get('student', '/student/dashboard')[0])
+        get('college', '/college/dashboard')
+        page, statements = get('college', '/college/dashboard')
+        self.assertIn(b'badge-warning', page)
+        self.assertFalse([s for s in statements if 'mo_u' in s])
+
+        # Approving the visit and the MoU change the version stamps, not the cache
+        get('college', f"/visit/approve/{ids['visit']}")
+        self.assertIn(b'% Match', get('student', '/student/dashboard')[0])
+        with self.client.session_transaction() as sess:
+            sess.update(user_id=ids['provider'], role='provider', name='Acme')
+        self.client.post(f"/mou/approve/{ids['mou']}", data={'start_date': '2030-01-01', 'end_date': '2031-01-01'})
+        self.assertIn(b'badge-success', get('college', '/college/dashboard')[0])
+
+        with tempfile.TemporaryDirectory() as directory:
+            cache = FileFragmentCache(directory, ttl=60)
+            cache.set('college-mous:1:v1', '<p>MoUs</p>')
+            self.assertEqual(cache.get('college-mous:1:v1'), '<p>MoUs</p>')
+            cache.ttl = -1
+            self.assertIsNone(cache.get('college-mous:1:v1'))
+
+    def test_api_etags_answer_304_until_data_changes(self):
+        """Test JSON API polls cost one version lookup while nothing changed"""
+        with app.app_context():
+            provider = User(email='p@test.com', name='Acme', role='provider')
+            student = User(email='s@test.com', name='Stu', role='student')
+            college = User(email='c@test.com', name='College', role='college')
+            db.session.add_all([provider, student, college])
+            db.session.flush()
+            db.session.add(IndustrialVisit(title='Plant Tour', description='Tour', company_name='Acme',
+                                           date=date(2030, 1, 1), location='Chennai', provider_id=provider.id))
+            db.session.commit()
+            ids = dict(college=college.id, student=student.id, visit=IndustrialVisit.query.first().id)
+
+        with self.client.session_transaction() as sess:
+            sess.update(user_id=ids['student'], role='student', name='Stu')
+        first = self.client.get('/api/notifications')
+        self.assertEqual(first.json['unread_count'], 0)
+        with count_queries() as statements:
+            again = self.client.get('/api/notifications', headers={'If-None-Match': first.headers['ETag']})
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(len(statements), 1)
+
+        with app.app_context():
+            notify_users([(ids['student'], 'Hello')])
+        changed = self.client.get('/api/notifications', headers={'If-None-Match': first.headers['ETag']})
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json['notifications'][0]['message'], 'Hello')
+
+        visits = self.client.get('/api/visits')
+        self.assertEqual(visits.json['items'], [])
+        with self.client.session_transaction() as sess:
+            sess.update(user_id=ids['college'], role='college', name='College')
+        self.client.get(f"/visit/approve/{ids['visit']}")
+        with self.client.session_transaction() as sess:
+            sess.update(user_id=ids['student'], role='student', name='Stu')
+        visits = self.client.get('/api/visits', headers={'If-None-Match': visits.headers['ETag']})
+        self.assertEqual([v['title'] for v in visits.json['items']], ['Plant Tour'])
+        self.client.get(f"/visit/apply/{ids['visit']}")
+        applications = self.client.get('/api/applications')
+        self.assertEqual(applications.json['items'][0]['visit']['id'], ids['visit'])
+
+    def test_notifications_pushed_to_streams(self):
+        """Test notify_users reaches an open SSE stream, and the relay shares events between brokers"""
+        with app.app_context():
+            student = User(email='s@test.com', name='Stu', role='student')
+            db.session.add(student)
+            db.session.commit()
+            student_id = student.id
+
+        with self.client.session_transaction() as sess:
+            sess.update(user_id=student_id, role='student', name='Stu')
+        response = self.client.get('/notifications/stream')
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        stream = iter(response.response)
+        self.assertIn(b'retry', next(stream))
+        with app.app_context():
+            notify_users([(student_id, 'Visit approved')])
+        self.assertIn(b'"message": "Visit approved"', next(stream))
+        response.close()
+
+        # The slot is taken on connect, before the stream starts; over the cap the browser
+        # is told to retry later, not given an error it won't retry
+        with mock.patch.dict(app.config, SSE_MAX_STREAMS=1):
+            first = self.client.get('/notifications/stream')
+            response = self.client.get('/notifications/stream')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data, b'retry: 60000\n\n')
+            first.close() # Never iterated, still frees the slot
+            response = self.client.get('/notifications/stream')
+            self.assertTrue(response.is_streamed)
+            response.close()
+
+        with RelayServer(('127.0.0.1', 0)) as relay:
+            threading.Thread(target=relay.serve_forever, daemon=True).start()
+            web, sweeper = RelayBroker(relay.server_address), RelayBroker(relay.server_address)
+            subscription = web.subscribe('notifications:1')
+            sweeper.publish('notifications:1', 'MoU expired')
+            self.assertEqual(subscription.get(timeout=5), 'MoU expired')
+            relay.shutdown()
+
+        # An unreachable relay is logged once per outage, not once per event
+        with socket.socket() as unused:
+            unused.bind(('127.0.0.1', 0))
+            address = unused.getsockname()
+        down = RelayBroker(address)
+        with mock.patch('builtins.print') as log:
+            for _ in range(3):
+                down.publish('notifications:1', 'MoU expired')
+        self.assertEqual(log.call_count, 1)
+
+    def test_recommendation_cache_invalidates_matching_students_only(self):
+        """Test a visit event drops only students sharing its keywords, and a profile edit drops the student"""
+        with app.app_context():
+            provider = User(email='p@test.com', name='Acme', role='provider')
+            college = User(email='c@test.com', name='College', role='college')
+            coder = User(email='s1@test.com', name='Coder', role='student', skills='Python')
+            cook = User(email='s2@test.com', name='Cook', role='student', skills='Cooking')
+            db.session.add_all([provider, college, coder, cook])
+            db.session.flush()
+            for title, status in [('Python Workshop', 'approved'), ('Cooking Class', 'approved'),
+                                  ('Python Bootcamp', 'pending')]:
+                visit = IndustrialVisit(title=title, description=title, company_name='Acme', date=date(2030, 1, 1),
+                                        location='Chennai', provider_id=provider.id, status=status)
+                db.session.add(visit)
+                db.session.flush()
+                index_visit(visit)
+            db.session.commit()
+            ids = dict(college=college.id, coder=coder.id, cook=cook.id,
+                       bootcamp=IndustrialVisit.query.filter_by(status='pending').first().id)
+
+        def recommend(student_id, k=3):
+            with app.app_context(), count_queries() as statements:
+                student = User.query.get(student_id)
+                titles = [r['visit'].title for r in recommendation_cache.recommend(student, k=k)]
+            return titles, len(statements) - 1 # Not counting the student lookup
+
+        self.assertEqual(recommend(ids['coder']), (['Python Workshop'], 2))
+        self.assertEqual(recommend(ids['cook']), (['Cooking Class'], 2))
+        self.assertEqual(recommend(ids['cook']), (['Cooking Class'], 1)) # Visits by primary key only
+
+        with self.client.session_transaction() as sess:
+            sess.update(user_id=ids['college'], role='college', name='College')
+        self.client.get(f"/visit/approve/{ids['bootcamp']}")
+        self.assertEqual(recommend(ids['cook']), (['Cooking Class'], 1))
+        self.assertEqual(recommend(ids['coder']), (['Python Workshop', 'Python Bootcamp'], 2))
+
+        with self.client.session_transaction() as sess:
+            sess.update(user_id=ids['cook'], role='student', name='Cook')
+        self.client.post('/student/profile/edit', data={'bio': '', 'skills': 'Python', 'resume_link': ''})
+        self.assertEqual(recommend(ids['cook']), (['Python Workshop', 'Python Bootcamp'], 2))
+
+        # Completed by another process: the cache isn't told, and a spare takes its place
+        with app.app_context():
+            IndustrialVisit.query.filter_by(title='Python Workshop').update({'status': 'completed'})
+            db.session.commit()
+        self.assertEqual(recommend(ids['cook'], k=1), (['Python Bootcamp'], 1))
+
+    def test_bulk_moderation_in_one_transaction(self):
+        """Test bulk approval updates in chunks, indexes and notifies each provider once"""
+        with app.app_context():
+            college = User(email='c@test.com', name='College', role='college')
+            providers = [User(email=f'p{i}@test.com', name=f'Provider {i}', role='provider') for i in range(3)]
+            db.session.add_all([college] + providers)
+            db.session.flush()
+            db.session.execute(insert(IndustrialVisit), [
+                {'title': f'Python Tour {i}', 'description': 'Tour', 'company_name': 'Acme', 'date': date(2030, 1, 1),
+                 'location': 'Chennai', 'provider_id': providers[i % 3].id, 'status': 'pending'}
+                for i in range(1200)])
+            db.session.commit()
+            ids = dict(college=college.id, providers=[p.id for p in providers])
+            first_id = IndustrialVisit.query.order_by(IndustrialVisit.id).first().id
+
+        with self.client.session_transaction() as sess:
+            sess.update(user_id=ids['college'], role='college', name='College')
+        self.client.post('/visit/moderate', data={'action': 'reject', 'visit_ids': [first_id]})
+        with assert_max_queries(self, 25):
+            self.client.post('/visit/moderate', data={'action': 'approve', 'all_pending': '1'})
+
+        with app.app_context():
+            self.assertEqual(IndustrialVisit.query.filter_by(status='approved').count(), 1199)
+            self.assertEqual(IndustrialVisit.query.get(first_id).status, 'rejected')
+            self.assertEqual(db.session.query(VisitKeyword.visit_id).filter_by(keyword='python').count(), 1199)
+            messages = Notification.query.filter(Notification.message.like('%approved%')).all()
+            self.assertEqual(sorted(n.user_id for n in messages), ids['providers'])
+            self.assertIn('400 of your opportunities were approved', messages[0].message)
+
+        # Already moderated visits are left alone
+        response = self.client.post('/visit/moderate', data={'action': 'reject', 'visit_ids': [first_id + 1]},
+                                    follow_redirects=True)
+        self.assertIn(b'No pending visits were selected', response.data)
+
+    def test_bulk_import_streams_csv_and_ndjson(self):
+        """Test the import inserts valid rows in batches and reports invalid ones by line"""
+        with app.app_context():
+            provider = User(email='p@test.com', name='Acme', role='provider')
+            db.session.add(provider)
+            db.session.commit()
+            provider_id = provider.id
+        with self.client.session_transaction() as sess:
+            sess.update(user_id=provider_id, role='provider', name='Acme')
+
+        lines = ['title,description,date,location,visit_type']
+        lines += [f'Robotics Lab {i},"Python, robots",2030-01-01,Chennai,Internship' for i in range(2500)]
+        lines += ['Bad Date,Tour,01/02/2030,Chennai,', 'Bad Type,Tour,2030-01-01,Chennai,Picnic', ',Tour,2030-01-01,Chennai,']
+        csv_file = BytesIO(('\n'.join(lines) + '\n').encode('utf-8'))
+        with count_queries() as statements:
+            response = self.client.post('/visit/import', data={'file': (csv_file, 'visits.csv')},
+                                        content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'<strong>2500</strong> opportunities imported, <strong>3</strong> rows', response.data)
+        self.assertIn(b'2502', response.data) # Line of the bad date
+        self.assertIn(b'Invalid visit_type', response.data)
+        self.assertEqual(len([s for s in statements if s.startswith('INSERT INTO industrial_visit')]), 3)
+
+        ndjson = b'{"title": "Mentor Hour", "description": "Career talk", "date": "2030-02-01", "location": "Online"}\n\n[1]\n'
+        response = self.client.post('/visit/import', data={'file': (BytesIO(ndjson), 'visits.ndjson')},
+                                    content_type='multipart/form-data')
+        self.assertIn(b'<strong>1</strong> opportunities imported, <strong>1</strong> rows', response.data)
+
+        with app.app_context():
+            self.assertEqual(IndustrialVisit.query.filter_by(provider_id=provider_id, status='pending').count(), 2501)
+            self.assertEqual(db.session.query(VisitKeyword.visit_id).filter_by(keyword='robots').count(), 2500)
+            self.assertEqual(IndustrialVisit.query.filter_by(title='Mentor Hour').one().visit_type, 'Industrial Visit')
+
+        response = self.client.post('/visit/import', data={'file': (BytesIO(b'x'), 'visits.xlsx')},
+                                    content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 400)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,60 @@
+"""
+Data version stamps for cache keys and ETags.
+
+Every write bumps the counters of the scopes it changes ('visits' for any
+visit listing; 'student:<id>', 'provider:<id>', 'college:<id>' for what one
+user's dashboard shows; 'notifications:<id>') in the same transaction as
+the change itself, which the caller commits. A stamp read after that commit
+always differs from the one a stale cache entry or ETag was made from, and
+a rolled back write leaves the counters alone.
+"""
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from models import db, DataVersion
+
+UPSERTS = {'postgresql': pg_insert, 'sqlite': sqlite_insert}
+VISITS_SCOPE = 'visits'
+
+
+def user_scope(kind, user_id):
+    # kind is the user's role for their dashboard data, or e.g. 'notifications'
+    return f'{kind}:{user_id}'
+
+
+def bump_versions(*scopes):
+    """Increments the scopes' counters in the current transaction; the caller commits."""
+    scopes = sorted(set(scopes)) # Same lock order in every transaction
+    if not scopes:
+        return
+    table = DataVersion.__table__
+    upsert = UPSERTS.get(db.engine.dialect.name)
+    if upsert is not None:
+        stmt = upsert(table).values([{'scope': scope, 'version': 1} for scope in scopes])
+        db.session.execute(stmt.on_conflict_do_update(index_elements=[table.c.scope],
+                                                      set_={'version': table.c.version + 1}))
+        return
+    # Other databases: update what exists, insert the rest
+    existing = set(db.session.execute(select(table.c.scope).where(table.c.scope.in_(scopes))
+                                      .with_for_update()).scalars())
+    if existing:
+        db.session.execute(update(table).where(table.c.scope.in_(existing)).values(version=table.c.version + 1))
+    missing = [{'scope': scope, 'version': 1} for scope in scopes if scope not in existing]
+    if missing:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(table.insert(), missing)
+        except IntegrityError:
+            bump_versions(*(row['scope'] for row in missing)) # Inserted concurrently
+
+def get_versions(*scopes):
+    """Returns {scope: version}; scopes never bumped are at 0."""
+    table = DataVersion.__table__
+    found = dict(db.session.execute(select(table.c.scope, table.c.version).where(table.c.scope.in_(scopes))).all())
+    return {scope: found.get(scope, 0) for scope in scopes}
+
+def version_stamp(*scopes):
+    """A single cache-key component for the scopes, e.g. 'visits=4,student:7=2'."""
+    versions = get_versions(*scopes)
+    return ','.join(f'{scope}={versions[scope]}' for scope in scopes)